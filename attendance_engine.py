@@ -0,0 +1,890 @@
+import os
+import threading
+import functools
+from copy import copy
+from operator import add
+from config import USER_DATA_PATH
+from excel_helpers import SheetSchema
+from attendance_matrix import SubjectMatrix, PRESENT, ABSENT, whole_number, number, format_mark
+from save_manager import WriteBehindSaver
+from journal import Journal, journal_path_for, read_checkpoint, write_checkpoint
+import styles
+from diagnostics import timed
+from catalog import describe_sheet
+from student_index import StudentIndex
+
+
+def locked(method):
+    """Runs an engine method while holding the engine's lock, so worker threads and the saver never interleave."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def editable(method):
+    """Like locked, for methods that change a sheet: a save in progress is told to start over, a workbook
+    opened in report mode is first reloaded for editing, and the sheet argument is swapped for its
+    editable counterpart."""
+    @functools.wraps(method)
+    def wrapper(self, sheet, *args, **kwargs):
+        with self.lock:
+            self.saver.begin_change()
+            if self.read_only:
+                self._upgrade()
+            return method(self, self.wb[sheet.title], *args, **kwargs)
+    return wrapper
+
+
+JOURNALED_OPS = set() # the only operations load() will replay
+
+
+def journaled(method):
+    """Appends a successful change to the workbook's journal. This runs under the engine lock, so the
+    entry exists before the caller sees the result and before any save can include the change."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.saver.begin_change()
+        result = method(self, *args, **kwargs)
+        if result[0] and self.journaling and not self._replaying:
+            journal = self._current_journal()
+            if journal is not None:
+                sheet = None
+                if args and not isinstance(args[0], str):
+                    sheet, args = args[0].title, args[1:]
+                # Callbacks (e.g. confirmations) have already been answered; replay runs without them
+                journal.append(method.__name__, sheet, list(args), {key: value for key, value in kwargs.items() if not callable(value)})
+        return result
+    JOURNALED_OPS.add(method.__name__)
+    return wrapper
+
+
+class AttendanceEngine:
+    """All workbook operations (marking, roster, assessments, final results and reports) without any GUI.
+    The Tk windows delegate to one instance; scripts, benchmarks and worker threads can use it directly."""
+    def __init__(self, data_path=USER_DATA_PATH, schedule=None, cancel=None, on_save_error=None, on_save_status=None, catalog=None,
+                 journaling=True):
+        self.data_path = data_path
+        self.catalog = catalog # Optional WorkbookCatalog, kept current after every save
+        self.current_filename = None
+        self.wb = None
+        self.read_only = False # True while a workbook is open in report mode
+        self._schemas = {} # sheet title -> SheetSchema, rebuilt on every load
+        self._matrices = {} # sheet title -> SubjectMatrix, the in-memory copy reports and summaries read from
+        self._students = None # StudentIndex of the whole workbook, built on first use after each load
+        self.journal = None # Journal of the current file, opened on first use
+        self.journaling = journaling # False for one-shot scripts that save explicitly (e.g. exports)
+        self._replaying = False
+        self.replayed = 0 # changes recovered from the journal by the last load()
+        self.lock = threading.RLock()
+        # Mutations only mark the workbook dirty; the saver writes it once per debounce window.
+        self.saver = WriteBehindSaver(lambda: self.wb, self.get_current_path, schedule=schedule, cancel=cancel,
+                                      on_error=on_save_error, on_status=on_save_status, lock=self.lock,
+                                      before_save=self._stamp_checkpoint, after_save=self._checkpoint_saved)
+
+    # --- Files and saving ---
+    def get_current_path(self):
+        """Returns the full path of the loaded file, or None."""
+        return os.path.join(self.data_path, self.current_filename) if self.current_filename else None
+
+    def find_excel_files(self):
+        return [f for f in os.listdir(self.data_path) if f.endswith('.xlsx')]
+
+    @timed("load")
+    @locked
+    def load(self, filename, report_mode=False):
+        """Loads a workbook from the data folder. Raises FileNotFoundError if it does not exist yet.
+        Unsaved changes to the previous workbook are dropped, so call flush() first.
+        In report mode the file is streamed read-only (values, no styles) and is only reloaded
+        for editing when something is first changed.
+        Changes from the journal that never made it into the file are replayed; self.replayed says how many."""
+        if not filename.endswith('.xlsx'): filename += '.xlsx'
+        self.current_filename = filename
+        self._schemas, self._matrices, self._students = {}, {}, None
+        self.saver.discard()
+        self._close_read_only()
+        self.wb, self.replayed = None, 0
+        journal = self._current_journal()
+        pending = journal.entries()
+        # Replaying needs an editable workbook; a file that was never saved is rebuilt from the journal alone
+        if pending: report_mode = False
+        import openpyxl as xl # Deferred until the first load so the app starts faster
+        try:
+            if not pending or os.path.exists(self.get_current_path()):
+                self.wb = xl.load_workbook(self.get_current_path(), read_only=report_mode)
+                self.read_only = report_mode
+        except Exception:
+            self.wb = None
+            raise
+        checkpoint = read_checkpoint(self.wb)
+        journal.seq = max(journal.seq, checkpoint)
+        self.replayed = self._replay([entry for entry in pending if entry['seq'] > checkpoint])
+        if self.wb is None:
+            raise FileNotFoundError(self.get_current_path())
+        return self.wb
+
+    # --- Journal ---
+    def _current_journal(self):
+        """The journal next to the current file, or None if no file is named yet."""
+        path = self.get_current_path()
+        if not path: return None
+        if self.journal is None or self.journal.path != journal_path_for(path):
+            self.journal = Journal(journal_path_for(path))
+        return self.journal
+
+    def _replay(self, entries):
+        """Re-applies journal entries in order; they stay in the journal until the next save."""
+        replayed = 0
+        self._replaying = True
+        try:
+            for entry in entries:
+                if entry.get('op') not in JOURNALED_OPS: continue
+                args = entry['args']
+                if entry['sheet'] is not None:
+                    if self.wb is None or entry['sheet'] not in self.wb.sheetnames: continue
+                    args = [self.wb[entry['sheet']]] + args
+                try:
+                    success = getattr(self, entry['op'])(*args, **entry['kwargs'])[0]
+                except Exception:
+                    success = False
+                replayed += bool(success)
+        finally:
+            self._replaying = False
+        return replayed
+
+    def _stamp_checkpoint(self, wb):
+        """Records in the workbook which journal entries it is about to contain.
+        Returns what _checkpoint_saved needs once the write is done: (filename, journal, seq)."""
+        journal = self._current_journal()
+        if journal is None or not self.journaling:
+            return self.current_filename, None, None
+        write_checkpoint(wb, journal.seq)
+        return self.current_filename, journal, journal.seq
+
+    def _checkpoint_saved(self, checkpoint):
+        """Runs after a save, outside the engine lock: drops the saved journal entries and updates the catalog."""
+        filename, journal, seq = checkpoint
+        if journal is not None:
+            journal.truncate(seq)
+        if self.catalog is not None:
+            with self.lock:
+                if filename != self.current_filename: return # Another file was loaded meanwhile
+                subjects = self.describe_subjects()
+            self.catalog.record(filename, subjects)
+
+    def describe_subjects(self):
+        """Catalog entries for every subject, from the in-memory indexes where they are already built."""
+        if self.wb is None: return {}
+        return {sheet.title: describe_sheet(sheet, self.schema_for(sheet),
+                                            self._matrices[sheet.title].num_students if sheet.title in self._matrices else None)
+                for sheet in self.wb.worksheets}
+
+    def _close_read_only(self):
+        """Releases the file handle a read-only workbook keeps open."""
+        if self.wb is not None and self.read_only:
+            self.wb.close()
+        self.read_only = False
+
+    def _upgrade(self):
+        """Replaces a report-mode workbook with a fully editable load of the same file."""
+        import openpyxl as xl
+        wb = xl.load_workbook(self.get_current_path())
+        self._close_read_only()
+        self.wb = wb
+        # Header indexes point at the old cells; the matrices hold plain values and are kept
+        self._schemas = {}
+        for title, matrix in self._matrices.items():
+            matrix.sheet = wb[title]
+
+    def request_save(self):
+        """Marks the workbook as changed; the write is coalesced with other recent changes."""
+        self.saver.mark_dirty()
+
+    def flush(self):
+        """Writes any pending changes now. Returns (success, message)."""
+        return self.saver.flush()
+
+    def save_in_background(self):
+        """Starts writing pending changes on the writer thread; the outcome goes to on_save_status/on_save_error."""
+        self.saver.save_async(announce=True)
+
+    def _current(self, sheet):
+        """Maps a sheet of a replaced report-mode workbook (still held by an open window) onto the loaded one."""
+        if self.wb is not None and sheet.parent is not self.wb and sheet.title in self.wb.sheetnames:
+            return self.wb[sheet.title]
+        return sheet
+
+    def schema_for(self, sheet):
+        """Returns the cached header index for a worksheet, building it on first use."""
+        sheet = self._current(sheet)
+        schema = self._schemas.get(sheet.title)
+        if schema is None or schema.sheet is not sheet:
+            schema = self._schemas[sheet.title] = SheetSchema(sheet)
+        return schema
+
+    def matrix_for(self, sheet):
+        """Returns the in-memory attendance and marks model of a worksheet, reading it on first use."""
+        sheet = self._current(sheet)
+        matrix = self._matrices.get(sheet.title)
+        if matrix is None or matrix.sheet is not sheet:
+            matrix = self._matrices[sheet.title] = self._read_matrix(sheet)
+        return matrix
+
+    @timed("read_sheet")
+    def _read_matrix(self, sheet):
+        matrix = SubjectMatrix.from_sheet(sheet, self.schema_for(sheet))
+        matrix.sheet = sheet
+        return matrix
+
+    @locked
+    def student_index(self):
+        """The workbook-wide StudentIndex, built on first use; roster and assessment changes keep it current."""
+        if self._students is None:
+            self._students = StudentIndex()
+            for sheet in (self.wb.worksheets if self.wb else []):
+                self._index_subject(sheet)
+        return self._students
+
+    def _index_subject(self, sheet, roster=True):
+        """Re-indexes one subject (or only its assessments) if the index has been built."""
+        if self._students is None: return
+        if roster:
+            matrix = self.matrix_for(sheet)
+            self._students.set_roster(sheet.title, matrix.names, matrix.rolls)
+        self._students.set_assessments(sheet.title, self.schema_for(sheet))
+
+    # --- Subjects and roster ---
+    @timed("add_subject")
+    @locked
+    @journaled
+    def add_subject(self, name):
+        """Creates and formats a new subject sheet, creating the workbook if needed."""
+        if self.read_only:
+            self._upgrade()
+        if self.wb is None:
+            import openpyxl as xl
+            self.wb = xl.Workbook()
+            self.wb.remove(self.wb.active)
+        if name in self.wb.sheetnames: return False, f"A subject named '{name}' already exists."
+        new_sheet = self.wb.create_sheet(title=name)
+        self.format_new_sheet(new_sheet)
+        self._index_subject(new_sheet)
+        self.request_save()
+        return True, f"Subject '{name}' was created."
+
+    def get_roster(self, sheet):
+        """Returns the (names, complex rolls) lists of a subject, one entry per student row."""
+        matrix = self.matrix_for(sheet)
+        return list(matrix.names), list(matrix.rolls)
+
+    def count_students(self, sheet):
+        """Number of student rows, as count_student_rows would find them."""
+        return self.matrix_for(sheet).num_students
+
+    @timed("update_students")
+    @editable
+    @journaled
+    def update_students(self, sheet, student_names, student_rolls):
+        """Replaces the student list (columns A-C) of a subject."""
+        old_count = self.count_students(sheet)
+        # Clear old student data from columns A, B, and C
+        for row in range(5, sheet.max_row + 5):
+            for col in range(1, 4): sheet.cell(row=row, column=col).value = None
+        
+        # Write new student data from the two lists
+        for i in range(len(student_names)):
+            sheet.cell(row=i+5, column=1).value = i + 1              # Simple Roll No.
+            sheet.cell(row=i+5, column=2).value = student_names[i]   # Name
+            sheet.cell(row=i+5, column=3).value = student_rolls[i]   # Complex Roll No.
+        
+        # Rows may have moved, so the in-memory copy is re-read on next use
+        self._matrices.pop(sheet.title, None)
+        self._index_subject(sheet)
+        # Only the roster columns and any brand-new rows need styling
+        styles.style_block(sheet, 5, len(student_names) + 4, 1, 3)
+        styles.style_block(sheet, old_count + 5, len(student_names) + 4, 4, self._find_true_last_column(sheet))
+        self.request_save()
+        return True, f"Student list for '{sheet.title}' updated."
+
+    # --- Assessments, marks and reports ---
+    def get_student_list(self, sheet):
+        """Gets a list of all student names from the sheet."""
+        return [name for name in self.matrix_for(sheet).names if name]
+
+    def get_assessment_list(self, sheet):
+        """Finds all assessment columns (those after the fixed summary block)."""
+        # Assessments start after the fixed summary block (after column Z=26)
+        return sorted(self.schema_for(sheet).assessment_cols())
+
+    def get_marks_for_assessment(self, sheet, assessment_name):
+        """Gets a list of marks for a given assessment column."""
+        if not self.schema_for(sheet).col(assessment_name): return []
+        return ['' if mark is None else format_mark(mark) for mark in self.matrix_for(sheet).mark_values(assessment_name)]
+
+    @timed("add_new_assessment_column")
+    @editable
+    @journaled
+    def add_new_assessment_column(self, sheet, name, max_marks, confirm_remove_final=None):
+        """Adds a new assessment column and safely removes any old final result column.
+        confirm_remove_final, if given, is called before an outdated FINAL RESULT column is deleted."""
+        try:
+            int(max_marks)
+        except (ValueError, TypeError):
+            return False, "Maximum Marks must be a number."
+        
+        new_name_upper = name.strip().upper()
+        if new_name_upper in [a.upper() for a in self.get_assessment_list(sheet)]:
+            return False, f"An assessment named '{name}' already exists."
+
+        # --- NEW: Specifically find and delete the "FINAL RESULT" column ---
+        schema = self.schema_for(sheet)
+        final_result_col = schema.col("FINAL RESULT")
+        
+        if final_result_col:
+            if confirm_remove_final is not None and not confirm_remove_final():
+                return False, "Operation cancelled by user."
+            schema.delete_cols(final_result_col)
+            self.matrix_for(sheet).final_results = None
+        
+        new_col = schema.true_last_column() + 1
+        
+        schema.write(3, new_col, f"Out of: {max_marks}")
+        schema.write(4, new_col, new_name_upper)
+        self.matrix_for(sheet).set_marks(new_name_upper, []) # The same stripped key the schema indexes it by
+        self._index_subject(sheet, roster=False)
+
+        self._style_new_column(sheet, new_col)
+        self.request_save()
+        return True, f"Assessment '{new_name_upper}' added successfully."
+
+    @timed("save_marks")
+    @editable
+    @journaled
+    def save_marks(self, sheet, assessment_name, marks_list):
+        """Saves a list of integer marks to the specified assessment column."""
+        col_idx = self.schema_for(sheet).col(assessment_name)
+        if not col_idx: return False, "Could not find the assessment column."
+
+        try:
+            matrix = self.matrix_for(sheet)
+            for i, mark in enumerate(marks_list):
+                sheet.cell(row=i + 5, column=col_idx).value = mark
+            matrix.set_marks(assessment_name, [number(mark) for mark in marks_list] + matrix.mark_values(assessment_name)[len(marks_list):])
+            
+            self.request_save()
+            return True, f"Marks for '{assessment_name}' saved successfully."
+        except Exception as e:
+            return False, f"An error occurred while saving: {e}"
+
+    @timed("save_mark_changes")
+    @editable
+    @journaled
+    def save_mark_changes(self, sheet, assessment_name, changes):
+        """Writes only the marks that changed: changes is a list of (student index, mark or None) pairs."""
+        col_idx = self.schema_for(sheet).col(assessment_name)
+        if not col_idx: return False, "Could not find the assessment column."
+
+        try:
+            for index, mark in changes:
+                sheet.cell(row=index + 5, column=col_idx).value = mark
+            self.matrix_for(sheet).update_marks(assessment_name, {index: number(mark) for index, mark in changes})
+            self.request_save()
+            return True, f"{len(changes)} changed mark(s) for '{assessment_name}' saved successfully."
+        except Exception as e:
+            return False, f"An error occurred while saving: {e}"
+
+    def get_max_marks(self, sheet, assessment_name):
+        """Finds the 'Out of: XX' value for a given assessment."""
+        schema = self.schema_for(sheet)
+        col = schema.col(assessment_name)
+        if col is None: return None
+        max_mark_str = str(schema.value(3, col) or '').replace('Out of: ', '')
+        try:
+            return int(max_mark_str)
+        except: return None
+
+    def get_all_dates_from_sheet(self, sheet):
+        """Gets a list of all unique attendance dates from the sheet."""
+        return self.schema_for(sheet).session_dates()
+
+    @timed("convert_marks")
+    @editable
+    @journaled
+    def convert_marks(self, sheet, assessment_name, current_max, new_max):
+        """Converts all marks in a column from one scale to another."""
+        schema = self.schema_for(sheet)
+        col_idx = schema.col(assessment_name)
+        if not col_idx: return False, "Could not find assessment column."
+        
+        try:
+            matrix = self.matrix_for(sheet)
+            converted = []
+            for i, old_mark in enumerate(matrix.mark_values(assessment_name)):
+                if old_mark is None:
+                    converted.append(None)
+                    continue
+                # Perform conversion and round to nearest whole number
+                new_mark = round((int(old_mark) / current_max) * new_max)
+                sheet.cell(row=i + 5, column=col_idx).value = new_mark
+                converted.append(new_mark)
+            matrix.set_marks(assessment_name, converted)
+            
+            # Update the max mark header
+            schema.write(3, col_idx, f"Out of: {new_max}")
+            self._index_subject(sheet, roster=False)
+            self.request_save()
+            return True, "Marks converted successfully."
+        except Exception as e:
+            return False, f"An error occurred during conversion: {e}"
+
+    @timed("calculate_final_result")
+    @editable
+    @journaled
+    def calculate_final_result(self, sheet, weights_dict, final_col_name):
+        """Calculates a weighted final score and adds it to a new, styled column."""
+        try:
+            # First, delete any pre-existing "FINAL RESULT" column to ensure a clean slate
+            schema = self.schema_for(sheet)
+            final_result_col = schema.col("FINAL RESULT")
+            matrix = self.matrix_for(sheet)
+            if final_result_col:
+                schema.delete_cols(final_result_col)
+                matrix.final_results = None
+
+            assessment_data = {}
+            for name in weights_dict.keys():
+                max_mark = self.get_max_marks(sheet, name)
+                col_idx = schema.col(name)
+                if max_mark is None or col_idx is None: return False, f"Could not find data for '{name}'."
+                assessment_data[name] = {'col': col_idx, 'max': max_mark}
+
+            new_col_idx = schema.true_last_column() + 1
+            schema.write(4, new_col_idx, final_col_name.upper())
+            
+            # Whole columns at a time: missing marks are stored as 0 and count as 0
+            num_students = matrix.num_students
+            scores = [0.0] * num_students
+            for name, weight in weights_dict.items():
+                data = assessment_data[name]
+                scores = list(map(add, scores, [(mark / data['max']) * weight for mark in matrix.marks[name]]))
+            results = [f"{score:.2f}" for score in scores]
+            for i, result in enumerate(results):
+                sheet.cell(row=i + 5, column=new_col_idx).value = result
+            matrix.final_results = results
+            
+            self._style_new_column(sheet, new_col_idx)
+            self.request_save()
+            return True, "Final result calculated successfully."
+        except Exception as e:
+            return False, f"An error occurred during calculation: {e}"
+
+    # --- Sheet formatting ---
+    def format_new_sheet(self, sheet):
+        """Applies all standard headers, including a FIXED summary block, to a new worksheet."""
+        sheet.sheet_view.showGridLines = False
+        
+        # Main Subject Title
+        sheet['D1'].value = sheet.title.upper()
+        
+        # Static Labels
+        sheet['B2'].value, sheet['B3'].value = "DATE :", "Hours Taken :"
+        
+        # Main table headers for student info
+        main_headers = {'A4': 'ROLL NO.', 'B4': 'NAME', 'C4': 'ROLL NUMBER'}
+        for cell_ref, text in main_headers.items():
+            sheet[cell_ref].value = text
+        
+        # --- Create the FIXED summary headers starting at Column W ---
+        summary_headers = {
+            'W4': 'TOTAL HOURS', 'X4': 'HOURS PRESENT',
+            'Y4': 'HOURS ABSENT', 'Z4': 'PERCENTAGE'
+        }
+        for cell_ref, text in summary_headers.items():
+            sheet[cell_ref].value = text
+
+        # Headers were written directly, so drop any index built for this title before
+        self._schemas.pop(sheet.title, None)
+        self._matrices.pop(sheet.title, None)
+        styles.set_column_widths(sheet, 26)
+        styles.style_block(sheet, 1, 4, 1, 26)
+
+    def apply_standard_styles(self, sheet, num_students):
+        """Full restyle of the whole data area (alignment, borders, fills and column widths).
+        Normal edits only style the cells they touch; this is for repairing a sheet on request."""
+        last_col = self._find_true_last_column(sheet)
+        styles.set_column_widths(sheet, last_col)
+        styles.style_block(sheet, 1, num_students + 4, 1, last_col)
+
+    @timed("restyle_sheet")
+    @editable
+    def restyle_sheet(self, sheet):
+        """Explicitly requested full restyle of a subject sheet."""
+        self.apply_standard_styles(sheet, self.count_students(sheet))
+        self.request_save()
+        return True, f"Formatting of '{sheet.title}' was repaired."
+
+    def _style_new_column(self, sheet, col):
+        """Styles a column that was just added after the existing ones."""
+        styles.set_column_widths(sheet, col)
+        styles.style_block(sheet, 1, self.count_students(sheet) + 4, col, col)
+
+    def _find_true_last_column(self, sheet):
+        """Returns the last column that contains actual header data."""
+        return self.schema_for(sheet).true_last_column()
+
+    def _find_percentage_col(self, sheet):
+        """Finds the column number for the 'PERCENTAGE' summary header, or None."""
+        return self.schema_for(sheet).col("PERCENTAGE")
+
+    # --- Reports ---
+    @timed("get_report_by_date")
+    @locked
+    def get_report_by_date(self, sheet, dates_list):
+        """Generates a summary of attendance for a list of dates."""
+        if not dates_list:
+            return ["Please select at least one date."]
+
+        # Counts for every session come from one cached pass; any selection is then just lookups
+        session_stats = self.matrix_for(sheet).session_stats()
+        
+        report_lines = []
+        for date_str in dates_list:
+            if date_str not in session_stats:
+                report_lines.append(f"Date '{date_str}' not found.")
+                continue
+
+            hours, present_count, absent_count = session_stats[date_str]
+            hours = hours or "N/A"
+            total = present_count + absent_count
+            report_lines.append(
+                f"Subject: {sheet.title}\n"
+                f"Report for {date_str}(Session Hours: {hours}):\n"
+                f"  - Present: {present_count} / {total}\n"
+                f"  - Absent: {absent_count} / {total}"
+            )
+        return report_lines
+
+    @timed("get_report_by_name")
+    @locked
+    def get_report_by_name(self, sheet, names_list):
+        """Generates a summary including attendance, marks, and final result."""
+        schema = self.schema_for(sheet)
+        matrix = self.matrix_for(sheet)
+        has_summary = schema.col("PERCENTAGE") is not None
+        assessment_cols = schema.assessment_cols()
+        assessments = self.get_assessment_list(sheet)
+        
+        report_lines = []
+        for name in names_list:
+            index = matrix.index_of_name(name)
+            if index is not None:
+                line = f"{name}: In subject ({sheet.title})"
+                # Add Attendance Data
+                if has_summary:
+                    _, hp, ha, perc = matrix.summary(index)
+                    line += f"\n  - Hours Present: {hp}\n  - Hours Absent: {ha}\n  - Percentage: {perc:.2f}%"
+                
+                # Add Marks Data
+                if assessments:
+                    line += "\n  --- Marks ---"
+                    for assessment_name in assessments:
+                        mark = matrix.mark(assessment_name, index)
+                        max_mark = str(schema.value(3, assessment_cols[assessment_name]) or '').replace('Out of: ','')
+                        if mark is not None:
+                            line += f"\n  - {assessment_name}: {format_mark(mark)}/{max_mark}"
+                
+                # --- NEW: Add Final Result Data ---
+                line += "\n  --- Final Result ---"
+                final_mark = matrix.final_results[index] if matrix.final_results is not None else None
+                line += f"\n  - FINAL RESULT: {final_mark if final_mark is not None else 'Not Calculated'}"
+
+                report_lines.append(line)
+            else:
+                report_lines.append(f"{name}:\n  - STUDENT NOT FOUND")
+        return report_lines
+
+    @timed("get_low_attendance_students")
+    @locked
+    def get_low_attendance_students(self, sheet, threshold_percent):
+        """Gets a list of students below a certain attendance percentage."""
+        if self._find_percentage_col(sheet) is None: return None
+        matrix = self.matrix_for(sheet)
+        if matrix.total_hours <= 0: return [] # Nothing has been marked yet
+        # Compares the value as it is shown in the sheet (two decimals); see SubjectMatrix.percentage_index
+        return [f"{matrix.names[index]} ({percentage:.2f}%)" for index, percentage in matrix.students_below(threshold_percent)]
+
+    @timed("get_low_attendance_across_workbook")
+    @locked
+    def get_low_attendance_across_workbook(self, threshold_percent):
+        """[(subject, low attendance list)] for every subject that has a PERCENTAGE column."""
+        if not self.wb: return []
+        results = []
+        for sheet in self.wb.worksheets:
+            students = self.get_low_attendance_students(sheet, threshold_percent)
+            if students is not None:
+                results.append((sheet.title, students))
+        return results
+
+    def get_all_students_in_workbook(self):
+        """A sorted master list of all unique students, from the workbook-wide index."""
+        if not self.wb:
+            return []
+        return self.student_index().all_names()
+
+    @timed("get_summary_for_student_across_all_sheets")
+    @locked
+    def get_summary_for_student_across_all_sheets(self, student_names_list):
+        """
+        Iterates through every sheet in the workbook and compiles a report for a list of students.
+        """
+        if not self.wb:
+            return "No workbook loaded."
+        if not student_names_list:
+            return "Please select at least one student."
+
+        final_report_parts = []
+        students = self.student_index()
+        
+        # Loop through each student the user selected
+        for student_name in student_names_list:
+            student_report_parts = [f"Showing summary for student: {student_name.upper()}", "="*40]
+            found_in = students.locate(student_name)
+            found_student = bool(found_in)
+
+            # Only the sheets listing this student, in workbook order
+            for sheet in self.wb.worksheets:
+                index = found_in.get(sheet.title)
+                if index is None:
+                    continue
+                matrix = self.matrix_for(sheet)
+
+                subject_report = [f"\n--- SUBJECT: {sheet.title.upper()} ---"]
+                
+                # Get Attendance, Marks, and Final Result data for this sheet
+                schema = self.schema_for(sheet)
+                if schema.col("PERCENTAGE"):
+                    _, hp, ha, perc = matrix.summary(index)
+                    subject_report.append(f"  - Percentage: {perc:.2f}% (Present: {hp}, Absent: {ha})")
+                
+                assessments = students.assessments.get(sheet.title)
+                if assessments:
+                    subject_report.append("  --- Marks ---")
+                    for assessment_name, max_mark in assessments:
+                        mark = matrix.mark(assessment_name, index)
+                        if mark is not None:
+                            subject_report.append(f"  - {assessment_name}: {format_mark(mark)}/{max_mark}")
+                
+                if matrix.final_results is not None:
+                    final_mark = matrix.final_results[index]
+                    subject_report.append(f"  - FINAL RESULT: {final_mark if final_mark is not None else 'N/A'}")
+                
+                student_report_parts.append("\n".join(subject_report))
+            
+            if found_student:
+                final_report_parts.append("\n".join(student_report_parts))
+
+        return "\n\n".join(final_report_parts)
+
+    # --- Attendance marking ---
+    def _find_summary_cols(self, sheet):
+        """Maps each summary header (TOTAL HOURS ... PERCENTAGE) to its current column."""
+        return self.schema_for(sheet).summary_cols()
+
+    def _write_summaries(self, sheet, matrix, summary_cols, num_rows):
+        """Serializes the in-memory totals of the first num_rows students into the summary block."""
+        for index in range(min(num_rows, matrix.num_students)):
+            total_hours, present_hours, absent_hours, percentage = matrix.summary(index)
+            row = index + 5
+            sheet.cell(row=row, column=summary_cols['TOTAL HOURS']).value = total_hours
+            sheet.cell(row=row, column=summary_cols['HOURS PRESENT']).value = present_hours
+            sheet.cell(row=row, column=summary_cols['HOURS ABSENT']).value = absent_hours
+            sheet.cell(row=row, column=summary_cols['PERCENTAGE']).value = f"{percentage:.2f}"
+
+    @timed("recalculate_summary")
+    @editable
+    def recalculate_summary(self, sheet, total_students=None):
+        """Verify mode: re-reads every attendance column and rewrites every student's summary.
+        Returns the number of rows whose stored totals were wrong and have been repaired."""
+        summary_cols = self._find_summary_cols(sheet)
+        if len(summary_cols) < 4: return 0
+        # Drop the in-memory copy so the totals come straight from the sheet
+        self._matrices.pop(sheet.title, None)
+        matrix = self.matrix_for(sheet)
+        if total_students is None: total_students = matrix.num_students
+        repaired = 0
+        for index in range(min(total_students, matrix.num_students)):
+            stored = (whole_number(sheet.cell(row=index + 5, column=summary_cols['TOTAL HOURS']).value),
+                      whole_number(sheet.cell(row=index + 5, column=summary_cols['HOURS PRESENT']).value))
+            if stored != matrix.summary(index)[:2]:
+                repaired += 1
+        self._write_summaries(sheet, matrix, summary_cols, total_students)
+        return repaired
+
+    @timed("mark_attendance")
+    @editable
+    @journaled
+    def mark_attendance(self, sheet, total_students, absent_list, num_hours, attendance_date, overwrite_col=None, verify=False):
+        """Final, robust logic for marking attendance with smart column insertion.
+        Summaries come from the in-memory matrix, updated by this session alone; pass verify=True to re-read the sheet."""
+        try:
+            # --- 1. Find the current location of the summary block ---
+            # We use "HOURS PRESENT" in row 4 as a reliable anchor.
+            schema = self.schema_for(sheet)
+            summary_start_col = None
+            if schema.col("HOURS PRESENT"):
+                summary_start_col = schema.col("HOURS PRESENT") - 1 # The block starts with TOTAL HOURS
+            
+            if not summary_start_col:
+                return False, "Could not find the summary block headers. Please check the sheet format."
+
+            # --- 2. Determine which column to write attendance to ---
+            attendance_col = 0
+            if overwrite_col:
+                attendance_col = overwrite_col
+            else:
+                attendance_col = schema.next_session_col()
+                
+                # --- THIS IS THE "SMART EXPANSION" ---
+                # If the next entry would be too close to the summary, insert new columns
+                if attendance_col >= summary_start_col - 1:
+                    self._insert_session_cols(sheet, summary_start_col, 10)
+                    # After inserting, the summary block has moved. We will find it again.
+            
+            # --- 3. Write the new attendance data ---
+            matrix = self.matrix_for(sheet)
+            statuses = self._write_session(sheet, matrix, attendance_col, attendance_date, num_hours, absent_list, total_students)
+
+            # --- 4. Update the summary block in its current location ---
+            # Find the summary columns again, as they might have moved
+            current_summary_cols = self._find_summary_cols(sheet)
+            if len(current_summary_cols) < 4:
+                 return False, "Summary headers are missing after update."
+
+            if verify:
+                self.recalculate_summary(sheet, total_students)
+            else:
+                matrix.set_session(attendance_col, attendance_date, whole_number(num_hours) or 0, statuses)
+                self._write_summaries(sheet, matrix, current_summary_cols, total_students)
+
+            self.request_save()
+            return True, "Attendance marked and summary updated!"
+        except Exception as e: return False, f"An error occurred: {e}"
+
+    def _insert_session_cols(self, sheet, idx, amount):
+        """Smart expansion: inserts empty, already styled session columns in front of the summary block."""
+        schema = self.schema_for(sheet)
+        schema.insert_cols(idx, amount=amount)
+        styles.set_column_widths(sheet, schema.true_last_column())
+        styles.style_block(sheet, 1, self.count_students(sheet) + 4, idx, idx + amount - 1)
+
+    def _write_session(self, sheet, matrix, col, attendance_date, num_hours, absent_list, total_students, undo=None):
+        """Writes one session's header and P/A cells and returns its status codes.
+        If an undo list is given, every cell's previous value and style is recorded in it first."""
+        schema = self.schema_for(sheet)
+        absent = set(absent_list)
+        # Students past total_students keep whatever this column already held
+        statuses = bytearray(matrix.session_statuses(col) or bytes(matrix.num_students))
+        if undo is not None:
+            undo.append(('header', 2, col, schema.value(2, col)))
+            undo.append(('header', 3, col, schema.value(3, col)))
+        schema.write(2, col, attendance_date)
+        schema.write(3, col, num_hours)
+        styles.style_block(sheet, 1, 4, col, col)
+        for index in range(min(total_students, matrix.num_students)):
+            cell = sheet.cell(row=index + 5, column=col)
+            if undo is not None:
+                undo.append(('cell', cell, cell.value, copy(cell._style)))
+            if matrix.serials[index] in absent:
+                statuses[index] = ABSENT
+                cell.value, cell.style = 'A', styles.ABSENT
+            else:
+                statuses[index] = PRESENT
+                cell.value, cell.style = 'P', styles.PRESENT
+        return statuses
+
+    @timed("mark_attendance_batch")
+    @editable
+    @journaled
+    def mark_attendance_batch(self, sheet, total_students, entries):
+        """Applies many sessions at once: entries is a list of (date, hours, absent roll numbers).
+        Existing dates are overwritten. The summaries and styles are written once and the workbook is
+        saved once; if anything fails, every change is rolled back and the sheet is left as it was."""
+        schema = self.schema_for(sheet)
+        summary_start_col = schema.col("TOTAL HOURS")
+        if not summary_start_col or len(self._find_summary_cols(sheet)) < 4:
+            return False, "Could not find the summary block headers. Please check the sheet format."
+        for attendance_date, num_hours, absent_list in entries:
+            if whole_number(num_hours) is None:
+                return False, f"Hours for {attendance_date} must be a whole number."
+            invalid_rolls = [r for r in absent_list if not 1 <= r <= total_students]
+            if invalid_rolls:
+                return False, f"Invalid Rolls {invalid_rolls} for {attendance_date} (out of range 1-{total_students})."
+
+        # --- Resolve every entry's column against one date index ---
+        date_cols = dict(schema.dates)
+        free_cols, col = [], 4
+        targets = []
+        for attendance_date, num_hours, absent_list in entries:
+            if attendance_date not in date_cols:
+                # Same search as next_session_col, continued past the columns already handed out
+                while col in schema.session_cols:
+                    col += 1
+                date_cols[attendance_date] = col
+                free_cols.append(col)
+                col += 1
+            targets.append((date_cols[attendance_date], attendance_date, num_hours, absent_list))
+
+        # Smart expansion, once: keep one empty column between the last session and the summary block
+        inserted = 0
+        if free_cols and free_cols[-1] >= summary_start_col - 1:
+            inserted = 10 * -(-(free_cols[-1] - summary_start_col + 2) // 10)
+
+        undo = []
+        matrix = self.matrix_for(sheet)
+        try:
+            if inserted:
+                self._insert_session_cols(sheet, summary_start_col, inserted)
+            for attendance_col, attendance_date, num_hours, absent_list in targets:
+                statuses = self._write_session(sheet, matrix, attendance_col, attendance_date, num_hours, absent_list, total_students, undo)
+                matrix.set_session(attendance_col, attendance_date, whole_number(num_hours) or 0, statuses)
+
+            summary_cols = self._find_summary_cols(sheet)
+            for index in range(min(total_students, matrix.num_students)):
+                for col in summary_cols.values():
+                    cell = sheet.cell(row=index + 5, column=col)
+                    undo.append(('cell', cell, cell.value, copy(cell._style)))
+            self._write_summaries(sheet, matrix, summary_cols, total_students)
+        except Exception as e:
+            self._rollback(sheet, undo, summary_start_col, inserted)
+            return False, f"No sessions were saved. An error occurred: {e}"
+
+        self.request_save()
+        return True, f"{len(entries)} sessions marked and summary updated!"
+
+    def _rollback(self, sheet, undo, insert_idx, inserted):
+        """Restores the cells recorded by a failed batch, then removes any columns it inserted."""
+        schema = self.schema_for(sheet)
+        for entry in reversed(undo):
+            if entry[0] == 'header':
+                schema.write(entry[1], entry[2], entry[3])
+            else:
+                cell, value, style = entry[1:]
+                cell.value, cell._style = value, style
+        if inserted:
+            schema.delete_cols(insert_idx, inserted)
+        # The in-memory copy may hold sessions that never made it, so it is re-read on next use
+        self._matrices.pop(sheet.title, None)
+
+    def get_complex_rolls(self, sheet):
+        """Gets a list of all complex roll numbers from column C."""
+        return [roll for roll in self.matrix_for(sheet).rolls if roll]
+
+    def roll_index(self, sheet):
+        """Serial roll number <-> complex roll number <-> row lookups of a subject's students."""
+        return self.matrix_for(sheet).roll_index()
+
+    def resolve_rolls(self, sheet, text):
+        """Turns typed roll numbers (serials, complex roll numbers or ranges of either) into serial numbers.
+        Returns (sorted serial numbers, the items that are not valid)."""
+        return self.roll_index(sheet).resolve(text, self.count_students(sheet))
@@ -0,0 +1,280 @@
+from array import array
+from bisect import bisect_left
+from operator import add, sub
+from student_index import normalize
+
+# Status codes stored in each session's bytearray
+EMPTY, PRESENT, ABSENT = 0, 1, 2
+STATUS_CODES = {'P': PRESENT, 'A': ABSENT}
+
+
+def whole_number(value):
+    """Parses a whole number from a cell value, returning None if it is not one."""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def number(value):
+    """Parses a mark from a cell value, returning None if it is not numeric."""
+    if value is None or isinstance(value, bool): return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def format_mark(value):
+    """Shows whole marks without a trailing '.0'."""
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+def _present_weights(statuses, hours):
+    """Maps a session's status codes to that session's hours for present students and 0 otherwise."""
+    if 0 <= hours <= 255:
+        # bytes.translate does the per-student mapping in C
+        table = bytearray(256)
+        table[PRESENT] = hours
+        return statuses.translate(table)
+    return [hours if status == PRESENT else 0 for status in statuses]
+
+
+class RollIndex:
+    """Serial roll number (column A) <-> complex roll number (column C) <-> row index of one subject,
+    so typed roll numbers and a live session's present list resolve with dict lookups."""
+    def __init__(self, serials, rolls):
+        self.serials = [whole_number(serial) for serial in serials]
+        self.rolls = list(rolls)
+        self.row_of_serial = {serial: index for index, serial in enumerate(self.serials) if serial is not None}
+        self.rows_of_roll = {} # normalized complex roll -> row indexes (a roll listed twice has two)
+        for index, roll in enumerate(self.rolls):
+            if roll: self.rows_of_roll.setdefault(normalize(roll), []).append(index)
+
+    def roll_of_serial(self, serial):
+        index = self.row_of_serial.get(serial)
+        return None if index is None else self.rolls[index]
+
+    def serials_of_roll(self, roll):
+        return [self.serials[index] for index in self.rows_of_roll.get(normalize(roll), ()) if self.serials[index] is not None]
+
+    def _lookup(self, item, total):
+        """('serial', n) for a serial number from 1 to total, ('rows', [...]) for a complex roll, else None."""
+        if item.isdigit() and 1 <= int(item) <= total:
+            return 'serial', int(item)
+        rows = self.rows_of_roll.get(normalize(item))
+        return ('rows', rows) if rows else None
+
+    def _resolve_item(self, item, total):
+        found = self._lookup(item, total)
+        if found is not None:
+            kind, value = found
+            return [value] if kind == 'serial' else [self.serials[index] for index in value]
+        # A range; complex rolls may contain '-' themselves, so try every split
+        for at, char in enumerate(item):
+            if char != '-': continue
+            first, last = self._lookup(item[:at].strip(), total), self._lookup(item[at + 1:].strip(), total)
+            if first is None or last is None or first[0] != last[0]: continue
+            if first[0] == 'serial':
+                if first[1] <= last[1]: return list(range(first[1], last[1] + 1))
+            elif first[1][0] <= last[1][-1]:
+                # Complex roll ranges follow the sheet order
+                return self.serials[first[1][0]:last[1][-1] + 1]
+        return None
+
+    def resolve(self, text, total):
+        """Compiles typed roll numbers in one pass. The comma-separated items may be serial numbers
+        (1 to total), complex roll numbers or ranges of either ('5-9', '22CS001-22CS010').
+        Returns (sorted serial numbers, the items that are not valid)."""
+        serials, invalid = set(), []
+        for item in text.split(','):
+            item = item.strip()
+            if not item: continue
+            resolved = [serial for serial in self._resolve_item(item, total) or () if serial is not None]
+            if resolved: serials.update(resolved)
+            else: invalid.append(item)
+        return sorted(serials), invalid
+
+    def absent_serials(self, present_rolls):
+        """Serial numbers of the students with a complex roll number that is not in present_rolls."""
+        present_rows = set()
+        for roll in present_rolls:
+            present_rows.update(self.rows_of_roll.get(normalize(roll), ()))
+        return [serial for index, (serial, roll) in enumerate(zip(self.serials, self.rolls))
+                if roll and serial is not None and index not in present_rows]
+
+
+class SubjectMatrix:
+    """Compact in-memory model of one subject sheet.
+
+    Attendance is one bytearray of status codes per session, session hours an int array, and
+    marks a float array plus a missing-value mask per assessment. Per-student present hours are
+    kept as an int array, so summaries and reports never have to go back to the openpyxl cells."""
+    def __init__(self, num_students):
+        self.num_students = num_students
+        self.sheet = None # the worksheet this was read from
+        self.serials, self.names, self.rolls = [], [], [] # columns A, B and C
+        self.session_cols, self.dates = [], []
+        self.hours = array('i')
+        self.statuses = [] # one bytearray per session
+        self.col_to_session = {}
+        self.marks, self.mark_masks = {}, {} # assessment -> array('d'), bytearray (1 = has a mark)
+        self.final_results = None # raw FINAL RESULT values, if that column exists
+        self.total_hours = 0
+        self.present_hours = array('i', bytes(4 * num_students))
+        self._name_index = None
+        self._roll_index = None
+        self.revision = 0 # bumped on every change so derived caches know when to rebuild
+        self._session_stats, self._stats_revision = None, None
+        self._percentage_index, self._percentage_revision = None, None
+
+    @classmethod
+    def from_sheet(cls, sheet, schema):
+        """Reads the student block of a sheet in a single pass."""
+        # Streams the rows (this also works on read-only worksheets); like count_student_rows,
+        # the student block ends at the first empty roll number in column A.
+        rows = []
+        for row in sheet.iter_rows(min_row=5, values_only=True):
+            if not row or row[0] is None: break
+            rows.append(row)
+        matrix = cls(len(rows))
+
+        def column(col):
+            return [row[col - 1] if col - 1 < len(row) else None for row in rows]
+
+        matrix.serials = column(1)
+        matrix.names = [str(value) if value else '' for value in column(2)]
+        matrix.rolls = [str(value) if value else '' for value in column(3)]
+
+        # Session columns run from D up to the summary block
+        summary_start = schema.col("TOTAL HOURS") or schema.true_last_column() + 1
+        for col in range(4, summary_start):
+            if schema.value(2, col) is None and schema.value(3, col) is None: continue
+            statuses = bytearray(STATUS_CODES.get(value, EMPTY) for value in column(col))
+            matrix._append_session(col, schema.value(2, col), whole_number(schema.value(3, col)) or 0, statuses)
+
+        for name, col in schema.assessment_cols().items():
+            matrix.set_marks(name, [number(value) for value in column(col)])
+        final_col = schema.col("FINAL RESULT")
+        if final_col:
+            matrix.final_results = column(final_col)
+        matrix.recompute()
+        return matrix
+
+    def _append_session(self, col, date_str, hours, statuses):
+        self.col_to_session[col] = len(self.session_cols)
+        self.session_cols.append(col)
+        self.dates.append(date_str)
+        self.hours.append(hours)
+        self.statuses.append(statuses)
+
+    def recompute(self):
+        """Rebuilds the per-student totals from every session."""
+        self.total_hours = sum(self.hours)
+        present = array('i', bytes(4 * self.num_students))
+        for hours, statuses in zip(self.hours, self.statuses):
+            if hours:
+                present = array('i', map(add, present, _present_weights(statuses, hours)))
+        self.present_hours = present
+        self.revision += 1
+
+    def session_statuses(self, col):
+        """Returns the status codes stored for the session in a sheet column, or None."""
+        index = self.col_to_session.get(col)
+        return None if index is None else self.statuses[index]
+
+    def set_session(self, col, date_str, hours, statuses):
+        """Adds or replaces the session in a sheet column, updating the totals incrementally."""
+        index = self.col_to_session.get(col)
+        if index is not None:
+            # Take the old session's contribution back out first
+            old_hours = self.hours[index]
+            if old_hours:
+                self.total_hours -= old_hours
+                self.present_hours = array('i', map(sub, self.present_hours, _present_weights(self.statuses[index], old_hours)))
+            self.dates[index], self.hours[index], self.statuses[index] = date_str, hours, statuses
+        else:
+            self._append_session(col, date_str, hours, statuses)
+        if hours:
+            self.total_hours += hours
+            self.present_hours = array('i', map(add, self.present_hours, _present_weights(statuses, hours)))
+        self.revision += 1
+
+    def session_stats(self):
+        """date -> (hours, present count, absent count) for every session (the first column of a repeated date),
+        computed in one pass over the attendance block and cached until the next change."""
+        if self._stats_revision != self.revision:
+            stats = {}
+            for col, date_str, hours, statuses in sorted(zip(self.session_cols, self.dates, self.hours, self.statuses), key=lambda session: session[0]):
+                if date_str is not None and date_str not in stats:
+                    # bytearray.count scans a whole session in C
+                    stats[date_str] = (hours, statuses.count(PRESENT), statuses.count(ABSENT))
+            self._session_stats, self._stats_revision = stats, self.revision
+        return self._session_stats
+
+    def summary(self, index):
+        """Returns (total, present, absent, percentage) for one student."""
+        present = self.present_hours[index]
+        percentage = (present / self.total_hours * 100) if self.total_hours > 0 else 0
+        return self.total_hours, present, self.total_hours - present, percentage
+
+    def percentages(self):
+        """Attendance percentage of every student."""
+        if self.total_hours <= 0: return [0.0] * self.num_students
+        total = self.total_hours
+        return [present / total * 100 for present in self.present_hours]
+
+    def percentage_index(self):
+        """(sorted percentages, matching row indexes) of the named students, with percentages rounded
+        to two decimals as the sheet shows them. Cached until the next change."""
+        if self._percentage_revision != self.revision:
+            ranked = sorted((round(percentage, 2), index) for index, percentage in enumerate(self.percentages()) if self.names[index])
+            self._percentage_index = ([percentage for percentage, _ in ranked], [index for _, index in ranked])
+            self._percentage_revision = self.revision
+        return self._percentage_index
+
+    def students_below(self, threshold_percent):
+        """(row index, rounded percentage) of the named students below a percentage, in row order
+        (a bisect of the percentage index)."""
+        percentages, indexes = self.percentage_index()
+        count = bisect_left(percentages, threshold_percent)
+        return sorted(zip(indexes[:count], percentages[:count]))
+
+    def set_marks(self, name, values):
+        """Stores one assessment's marks; None means no mark."""
+        values = list(values[:self.num_students]) + [None] * (self.num_students - len(values))
+        self.marks[name] = array('d', (0.0 if value is None else value for value in values))
+        self.mark_masks[name] = bytearray(0 if value is None else 1 for value in values)
+        self.revision += 1
+
+    def update_marks(self, name, changes):
+        """Changes some students' marks in place: changes maps row index -> mark or None."""
+        if name not in self.marks:
+            self.set_marks(name, [])
+        marks, mask = self.marks[name], self.mark_masks[name]
+        for index, value in changes.items():
+            if 0 <= index < self.num_students:
+                marks[index], mask[index] = (0.0, 0) if value is None else (value, 1)
+        self.revision += 1
+
+    def mark_values(self, name):
+        """One assessment's marks as a list with None for missing marks."""
+        if name not in self.marks: return [None] * self.num_students
+        return [value if has_mark else None for value, has_mark in zip(self.marks[name], self.mark_masks[name])]
+
+    def mark(self, name, index):
+        """One student's mark for an assessment, or None."""
+        if name not in self.marks or not self.mark_masks[name][index]: return None
+        return self.marks[name][index]
+
+    def roll_index(self):
+        """The RollIndex of this subject's students, built on first use."""
+        if self._roll_index is None:
+            self._roll_index = RollIndex(self.serials, self.rolls)
+        return self._roll_index
+
+    def index_of_name(self, name):
+        """Row index of a student by name (case-insensitive), or None."""
+        if self._name_index is None:
+            self._name_index = {student.upper(): index for index, student in enumerate(self.names) if student}
+        return self._name_index.get(name.upper())
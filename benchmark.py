@@ -0,0 +1,290 @@
+# Headless benchmarks for the attendance and marks hot paths.
+#
+#     python benchmark.py                                   # the 'small' scale
+#     python benchmark.py --scale medium --output bench.json
+#     python benchmark.py --students 200 --sessions 60 --subjects 3
+#     python benchmark.py --startup                         # app start-up time only
+#     python benchmark.py --live 20                         # 20 live sessions polling mock_server.py
+#
+# Synthetic workbooks are generated in the app's sheet layout in a temporary folder. Every
+# operation reports the time of its first call, the min/median of the repeats and the peak
+# Python memory (tracemalloc) of one extra traced call, as JSON so runs can be compared.
+# The start-up benchmark imports main.py in fresh interpreters and fails (exit code 1) if
+# a module that should load on first use was imported before the main window shows.
+# The live benchmark runs OTP sessions against the local mock server while students join,
+# and compares one shared session manager (incremental, adaptive polls) with a thread per
+# session polling the full list.
+
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+# students, sessions per subject, subjects
+SCALES = {
+    'small': (50, 30, 1),
+    'medium': (500, 300, 20),
+    'large': (5000, 1000, 100),
+}
+
+# Loaded on first use (a file load, a window or a live session), never at start-up
+DEFERRED_MODULES = ('openpyxl', 'requests', 'ui_windows')
+
+# Run in a fresh interpreter: time 'import main' and, when a display is available, the first paint
+_STARTUP_SCRIPT = '''
+import sys, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+painted = None
+modules = [m for m in %r if m in sys.modules]
+try:
+    app = main.AttendanceApp()
+    modules = [m for m in %r if m in sys.modules]
+    # Work scheduled for after the first paint (listing files, refreshing the catalog) may load more
+    app.update()
+    painted = time.perf_counter() - start
+    app.destroy()
+except Exception:
+    pass
+print(json.dumps({"import": imported, "paint": painted, "modules": modules}))
+''' % (DEFERRED_MODULES, DEFERRED_MODULES)
+
+
+def _engine(data_path):
+    from attendance_engine import AttendanceEngine
+    # Saves only happen when a benchmark asks for one
+    return AttendanceEngine(data_path=data_path, schedule=lambda delay_ms, callback: None, cancel=lambda token: None)
+
+
+def _session_dates(count, start=date(2020, 1, 1)):
+    return [(start + timedelta(days=i)).strftime("%d-%m-%Y") for i in range(count)]
+
+
+def generate_workbook(data_path, filename, students, sessions, subjects, seed=0):
+    """Builds and saves a workbook with the given number of subjects, students, sessions and three assessments."""
+    rng = random.Random(seed)
+    engine = _engine(data_path)
+    engine.current_filename = filename
+    names = [f"STUDENT {i + 1:05d}" for i in range(students)]
+    rolls = [f"22CS{i + 1:05d}" for i in range(students)]
+    dates = _session_dates(sessions)
+    for s in range(subjects):
+        subject = f"SUBJECT {s + 1}"
+        engine.add_subject(subject)
+        sheet = engine.wb[subject]
+        engine.update_students(sheet, names, rolls)
+        entries = [(d, rng.randint(1, 3), rng.sample(range(1, students + 1), rng.randint(0, max(1, students // 10)))) for d in dates]
+        engine.mark_attendance_batch(sheet, students, entries)
+        for assessment in ("CAT 1", "CAT 2", "ASSIGNMENT"):
+            engine.add_new_assessment_column(sheet, assessment, 50)
+            engine.save_marks(sheet, assessment, [rng.randint(0, 50) for _ in range(students)])
+    success, message = engine.flush()
+    if not success: raise RuntimeError(message)
+    return dates
+
+
+def _measure(func, repeat):
+    """Times func; the first call is reported on its own since it includes building caches."""
+    timings = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {**_timing_stats(timings), "peak_kib": round(peak / 1024, 1)}
+
+
+def _timing_stats(timings):
+    repeats = timings[1:] or timings
+    return {
+        "first_seconds": round(timings[0], 6),
+        "min_seconds": round(min(repeats), 6),
+        "median_seconds": round(statistics.median(repeats), 6),
+        "runs": len(timings),
+    }
+
+
+def run_startup(repeat=3):
+    """Starts the app in repeat + 1 fresh interpreters; the first run has cold OS file caches."""
+    runs = []
+    for _ in range(repeat + 1):
+        output = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    painted = [run["paint"] for run in runs if run["paint"] is not None]
+    return {
+        "import_main": _timing_stats([run["import"] for run in runs]),
+        "first_paint": _timing_stats(painted) if len(painted) == len(runs) else None,
+        "deferred_modules_loaded": sorted({m for run in runs for m in run["modules"]}),
+    }
+
+
+def run_live(sessions, students=300, seconds=10, rate=20, seed=0):
+    """Polls 'sessions' concurrent live sessions on the mock server for a number of seconds while 'rate'
+    students per second join each one: first all through one LiveSessionManager (incremental polls,
+    adaptive interval, shared connection pool), then with one thread per session re-fetching the full
+    list on a fixed interval. Reports the requests, bytes and threads each needed."""
+    import threading
+    from live_client import LiveClient, LiveSessionManager
+    from mock_server import start_server, simulate_students
+    rolls = [f"22CS{i + 1:05d}" for i in range(students)]
+    report = {"sessions": sessions, "students": students, "seconds": seconds, "join_rate": rate}
+    for mode in ("manager", "thread_per_session"):
+        server = start_server(ttl=seconds * 2)
+        stop = threading.Event()
+        threads_before = threading.active_count()
+        if mode == "manager":
+            manager = LiveSessionManager(dispatch=lambda callback: callback(), client=LiveClient(server.base_url), min_interval=0.1, max_interval=1)
+            clients = [manager.client]
+            otps = [manager.client.start_session("SUBJECT 1", rolls)['otp'] for _ in range(sessions)]
+            threading.Thread(target=simulate_students, args=(server, rate, stop, seed), daemon=True).start()
+            for otp in otps: manager.watch(otp, lambda present: None)
+        else:
+            clients = [LiveClient(server.base_url) for _ in range(sessions)]
+            otps = [client.start_session("SUBJECT 1", rolls)['otp'] for client in clients]
+            threading.Thread(target=simulate_students, args=(server, rate, stop, seed), daemon=True).start()
+            def poll_full(client, otp):
+                while not stop.wait(0.1):
+                    client.get_present_list(otp, full=True)
+            pollers = [threading.Thread(target=poll_full, args=pair, daemon=True) for pair in zip(clients, otps)]
+            for poller in pollers: poller.start()
+        stop.wait(seconds)
+        # Besides the mock server's own (one per open connection)
+        threads = threading.active_count() - threads_before
+        stop.set()
+        if mode == "manager":
+            for otp in otps: manager.unwatch(otp)
+        else:
+            for poller in pollers: poller.join()
+        # The last poll must agree with the server whichever way it was fetched
+        pairs = [(clients[0], otp) for otp in otps] if mode == "manager" else list(zip(clients, otps))
+        in_sync = all(set(client.get_present_list(otp)[0]) == set(server.sessions[otp].marked) for client, otp in pairs)
+        report[mode] = {
+            "requests": sum(client.requests for client in clients),
+            "not_modified": sum(client.not_modified for client in clients),
+            "kib_received": round(sum(client.bytes_received for client in clients) / 1024, 1),
+            "threads": threads,
+            "in_sync": in_sync,
+        }
+        if mode == "manager": manager.shutdown()
+        else:
+            for client in clients: client.close()
+        server.shutdown()
+        server.server_close()
+    return report
+
+
+def run_scale(students, sessions, subjects, repeat=3, seed=0):
+    """Runs every benchmark against one synthetic workbook and returns the results dict."""
+    data_path = tempfile.mkdtemp(prefix="attender-bench-")
+    filename = "bench.xlsx"
+    try:
+        start = time.perf_counter()
+        dates = generate_workbook(data_path, filename, students, sessions, subjects, seed)
+        generate_seconds = time.perf_counter() - start
+        size_kib = os.path.getsize(os.path.join(data_path, filename)) / 1024
+
+        engine = _engine(data_path)
+        results = {}
+        results['load_file'] = _measure(lambda: engine.load(filename), repeat)
+        results['load_file_report_mode'] = _measure(lambda: engine.load(filename, report_mode=True), repeat)
+        engine.load(filename)
+        sheet = engine.wb["SUBJECT 1"]
+        rng = random.Random(seed + 1)
+        new_dates = iter(_session_dates(100000, start=date(2100, 1, 1)))
+        absent = lambda: rng.sample(range(1, students + 1), max(1, students // 10))
+
+        results['mark_attendance_new'] = _measure(lambda: engine.mark_attendance(sheet, students, absent(), 2, next(new_dates)), repeat)
+        overwrite_col = engine.schema_for(sheet).dates[dates[0]]
+        results['mark_attendance_overwrite'] = _measure(
+            lambda: engine.mark_attendance(sheet, students, absent(), 2, dates[0], overwrite_col=overwrite_col), repeat)
+        results['bulk_entry_10_sessions'] = _measure(
+            lambda: engine.mark_attendance_batch(sheet, students, [(next(new_dates), 1, absent()) for _ in range(10)]), repeat)
+        results['get_report_by_date'] = _measure(lambda: engine.get_report_by_date(sheet, rng.sample(dates, min(5, len(dates)))), repeat)
+        names = engine.get_student_list(sheet)
+        results['get_report_by_name'] = _measure(lambda: engine.get_report_by_name(sheet, rng.sample(names, min(10, len(names)))), repeat)
+        results['get_summary_for_student_across_all_sheets'] = _measure(
+            lambda: engine.get_summary_for_student_across_all_sheets([rng.choice(names)]), repeat)
+        results['get_low_attendance_students'] = _measure(lambda: engine.get_low_attendance_students(sheet, 75), repeat)
+        results['calculate_final_result'] = _measure(
+            lambda: engine.calculate_final_result(sheet, {"CAT 1": 40, "CAT 2": 40, "ASSIGNMENT": 20}, "FINAL RESULT"), repeat)
+
+        def save():
+            engine.request_save()
+            success, message = engine.flush()
+            if not success: raise RuntimeError(message)
+        results['save'] = _measure(save, repeat)
+
+        return {
+            "students": students, "sessions": sessions, "subjects": subjects,
+            "generate_seconds": round(generate_seconds, 3),
+            "file_size_kib": round(size_kib, 1),
+            "results": results,
+        }
+    finally:
+        shutil.rmtree(data_path, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the attendance engine on synthetic workbooks.")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES), help="preset scale; may be repeated (default: small)")
+    parser.add_argument("--students", type=int, help="custom scale: number of students")
+    parser.add_argument("--sessions", type=int, help="custom scale: sessions per subject")
+    parser.add_argument("--subjects", type=int, help="custom scale: number of subjects")
+    parser.add_argument("--startup", action="store_true", help="measure app start-up (import and first paint) instead of a scale")
+    parser.add_argument("--live", type=int, metavar="SESSIONS", help="poll this many live sessions on the local mock server instead of a scale")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repeats per operation after the first call")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    runs = [(name, *SCALES[name]) for name in (args.scale or [])]
+    if (args.students or args.sessions or args.subjects) and not args.live:
+        runs.append(("custom", args.students or 50, args.sessions or 30, args.subjects or 1))
+    if not runs and not args.startup and not args.live:
+        runs.append(("small", *SCALES['small']))
+
+    import openpyxl
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "openpyxl": openpyxl.__version__,
+        "scales": [],
+    }
+    if args.startup:
+        print("Measuring start-up...", file=sys.stderr)
+        report["startup"] = run_startup(args.repeat)
+    if args.live:
+        print(f"Polling {args.live} live session(s) on the mock server...", file=sys.stderr)
+        report["live"] = run_live(args.live, args.students or 300)
+    for name, students, sessions, subjects in runs:
+        print(f"Running '{name}': {students} students x {sessions} sessions x {subjects} subjects...", file=sys.stderr)
+        report["scales"].append({"name": name, **run_scale(students, sessions, subjects, args.repeat)})
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    loaded = report.get("startup", {}).get("deferred_modules_loaded")
+    if loaded:
+        print(f"Start-up regression: {', '.join(loaded)} imported before the main window shows.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
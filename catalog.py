@@ -0,0 +1,129 @@
+import os
+import json
+import threading
+import contextlib
+from datetime import datetime
+from config import CATALOG_FILENAME
+from excel_helpers import SheetSchema
+
+
+def describe_sheet(sheet, schema=None, num_students=None):
+    """Catalog entry of one subject: its student and session counts and the last marked date."""
+    schema = schema or SheetSchema(sheet)
+    if num_students is None:
+        num_students = 0
+        for (roll,) in sheet.iter_rows(min_row=5, max_col=1, values_only=True):
+            if roll is None: break
+            num_students += 1
+    marked = []
+    for date_str in schema.dates:
+        with contextlib.suppress(ValueError):
+            marked.append(datetime.strptime(date_str, "%d-%m-%Y"))
+    return {
+        "students": num_students,
+        "sessions": len(schema.dates),
+        "last_marked": max(marked).strftime("%d-%m-%Y") if marked else None,
+    }
+
+
+def describe_workbook(path):
+    """Reads a workbook read-only (values, header rows and column A only) and describes each subject."""
+    import openpyxl as xl
+    wb = xl.load_workbook(path, read_only=True)
+    try:
+        return {sheet.title: describe_sheet(sheet) for sheet in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def describe_entry(entry):
+    """One-line summary of a catalog entry for the file picker."""
+    subjects = entry["subjects"].values()
+    students = max((subject["students"] for subject in subjects), default=0)
+    sessions = sum(subject["sessions"] for subject in subjects)
+    last = max((datetime.strptime(subject["last_marked"], "%d-%m-%Y") for subject in subjects if subject["last_marked"]), default=None)
+    text = f"{len(entry['subjects'])} subject(s), {students} students, {sessions} sessions"
+    if last: text += f", last marked {last.strftime('%d-%m-%Y')}"
+    return text + f" ({entry['size'] / 1024:.0f} KB)"
+
+
+class WorkbookCatalog:
+    """Sidecar cache (CATALOG_FILENAME in the data folder) of what each workbook holds, so the file
+    picker can show it without loading the file. Entries are keyed by path and only trusted while the
+    file's size and modification time still match; refresh_async re-reads the stale ones."""
+    def __init__(self, data_path, on_change=None):
+        self.data_path = data_path
+        self.path = os.path.join(data_path, CATALOG_FILENAME)
+        # Called with a filename whenever its entry changes, from the saver or the refresh thread and
+        # with no engine lock held; a GUI must only queue work here, never call Tk
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._entries = self._read()
+        self._refresher = None
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def _stat(self, filename):
+        path = os.path.join(self.data_path, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return path, None
+        return path, (st.st_size, st.st_mtime_ns)
+
+    def get(self, filename):
+        """The cached entry {"size", "mtime_ns", "subjects": {name: {...}}} if it is still current, else None."""
+        path, stat = self._stat(filename)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None or stat is None or (entry["size"], entry["mtime_ns"]) != stat:
+            return None
+        return entry
+
+    def record(self, filename, subjects):
+        """Stores the subjects of a workbook as it is on disk right now (e.g. just after saving it)."""
+        path, stat = self._stat(filename)
+        if stat is None: return
+        with self._lock:
+            self._entries[path] = {"size": stat[0], "mtime_ns": stat[1], "subjects": subjects}
+            with contextlib.suppress(OSError):
+                self._write()
+        if self.on_change:
+            self.on_change(filename)
+
+    def refresh_async(self, filenames):
+        """Re-reads the listed workbooks whose entries are stale, one at a time on a background thread."""
+        if self._refresher is not None and self._refresher.is_alive(): return
+        self._refresher = threading.Thread(target=self._refresh, args=(list(filenames),), name="catalog-refresh", daemon=True)
+        self._refresher.start()
+
+    def _refresh(self, filenames):
+        wanted = {self._stat(filename)[0] for filename in filenames}
+        with self._lock:
+            # Forget files that are gone from the folder
+            gone = [path for path in self._entries if path not in wanted]
+            for path in gone:
+                del self._entries[path]
+            if gone:
+                with contextlib.suppress(OSError):
+                    self._write()
+        for filename in filenames:
+            if self.get(filename) is not None: continue
+            try:
+                subjects = describe_workbook(os.path.join(self.data_path, filename))
+            except Exception:
+                continue # Open in Excel, corrupt or not a workbook; try again next refresh
+            self.record(filename, subjects)
+
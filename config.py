@@ -19,4 +19,46 @@ def resource_path(relative_path):
 USER_DATA_PATH = os.path.join(os.path.expanduser('~'), 'Documents', 'AttendanceMarker')
 
 # Creates this folder automatically if it doesn't exist.
-os.makedirs(USER_DATA_PATH, exist_ok=True)
\ No newline at end of file
+os.makedirs(USER_DATA_PATH, exist_ok=True)
+
+# --- Saving ---
+# How often the main window runs the work (save messages, catalog and live session updates) that
+# background threads have queued for it; they never call Tk themselves.
+UI_QUEUE_POLL_MS = 50
+# Workbook changes are written to disk at most once per this many milliseconds.
+SAVE_DEBOUNCE_MS = 2000
+# Saves serialize the workbook without blocking the app; one that is changed meanwhile is written
+# again, and after this many tries the last one holds the workbook still while it is written.
+SAVE_ATTEMPTS = 3
+# Every change is also appended to '<file>.journal' until the next save, so a crash or a failed
+# save never loses it. Set to True to fsync each line as well (survives power loss, but slower).
+JOURNAL_FSYNC = False
+
+# --- Diagnostics ---
+# How many recent operations (load, save, mark, reports...) the diagnostics panel (Ctrl+Shift+D) keeps.
+DIAGNOSTICS_BUFFER_SIZE = 500
+# Set to a file path (or start with '--profile [file]') to cProfile the whole session into it.
+PROFILE_ENV_VAR = "ATTENDER_PROFILE"
+# Set to 1 (or start with '--diagnostics') to count the cells each operation reads and writes. This
+# patches openpyxl and slows every cell access a little, so it is off unless asked for or profiling.
+DIAGNOSTICS_ENV_VAR = "ATTENDER_DIAGNOSTICS"
+
+# --- Workbook catalog ---
+# Sidecar in the data folder caching each workbook's subjects and counts for the file picker.
+CATALOG_FILENAME = ".attender_catalog.json"
+
+# --- Live sessions ---
+# Base URL of the OTP attendance API. Set ATTENDER_API_URL to use another server, e.g. the local
+# stand-in started by 'python mock_server.py' (http://127.0.0.1:8765/attendance/api/).
+LIVE_API_URL = os.environ.get("ATTENDER_API_URL", "https://ismailisims.pythonanywhere.com/attendance/api/")
+# Seconds between polls of the present list: LIVE_POLL_MIN while students are joining, growing to
+# LIVE_POLL_MAX while nothing changes, and up to LIVE_POLL_BACKOFF after connection errors.
+LIVE_POLL_MIN = 2
+LIVE_POLL_MAX = 10
+LIVE_POLL_BACKOFF = 60
+# All open live sessions share one polling loop and this many HTTP connections.
+LIVE_HTTP_WORKERS = 4
+# Failed final-list and finish-session calls are retried this many times, waiting 1, 2, 4... seconds.
+LIVE_RETRY_ATTEMPTS = 6
+# Sidecar in the data folder checkpointing unsaved live sessions (OTP, date, hours, last present list).
+LIVE_STORE_FILENAME = ".attender_live.json"
@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import cProfile
+import threading
+import functools
+from collections import deque
+from config import DIAGNOSTICS_BUFFER_SIZE, PROFILE_ENV_VAR, DIAGNOSTICS_ENV_VAR
+
+# --- Operation log ---
+# The most recent operations, oldest first; each is a dict (see timed).
+_operations = deque(maxlen=DIAGNOSTICS_BUFFER_SIZE)
+# Per-thread running totals; timed() records the difference over each call
+_counters = threading.local()
+_counters_installed = False
+_counters_wanted = False
+_profiler = None
+_profile_path = None
+
+
+def count(kind, amount=1):
+    """Adds to one of this thread's counters: 'cell_reads', 'cell_writes' or 'bytes_written'."""
+    setattr(_counters, kind, getattr(_counters, kind, 0) + amount)
+
+
+def _snapshot():
+    return (getattr(_counters, 'cell_reads', 0), getattr(_counters, 'cell_writes', 0), getattr(_counters, 'bytes_written', 0))
+
+
+def timed(name):
+    """Records the wall time, cell reads/writes and bytes written of every call in the operation log."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _counters_wanted and not _counters_installed and 'openpyxl' in sys.modules:
+                install_cell_counters()
+            before = _snapshot()
+            started, start = time.time(), time.perf_counter()
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                # Engine methods report failures as (False, message)
+                ok = not (isinstance(result, tuple) and result and result[0] is False)
+                return result
+            finally:
+                after = _snapshot()
+                _operations.append({
+                    "name": name, "started": started, "seconds": time.perf_counter() - start,
+                    "cell_reads": after[0] - before[0], "cell_writes": after[1] - before[1],
+                    "bytes_written": after[2] - before[2], "thread": threading.current_thread().name, "ok": ok,
+                })
+        return wrapper
+    return decorator
+
+
+def operations():
+    return list(_operations)
+
+
+def slowest(limit=20):
+    """The slowest operations still in the log, slowest first."""
+    return sorted(list(_operations), key=lambda op: op["seconds"], reverse=True)[:limit]
+
+
+def summary():
+    """Per operation name: (calls, total seconds, max seconds), by total time."""
+    totals = {}
+    for op in list(_operations):
+        calls, total, longest = totals.get(op["name"], (0, 0.0, 0.0))
+        totals[op["name"]] = (calls + 1, total + op["seconds"], max(longest, op["seconds"]))
+    return sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+
+
+def clear():
+    _operations.clear()
+
+
+def install_cell_counters():
+    """Counts openpyxl cell lookups, streamed cells and value writes (a small cost on every access,
+    so the app only turns this on when counters_requested; benchmarks measure without it).
+    Does not import openpyxl: if it is not loaded yet, the first timed operation after it is installs them."""
+    global _counters_installed, _counters_wanted
+    _counters_wanted = True
+    if _counters_installed or 'openpyxl' not in sys.modules: return
+    from openpyxl.cell.cell import Cell
+    from openpyxl.worksheet.worksheet import Worksheet
+    from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+    set_value = Cell.value.fset
+    def counted_set(cell, value):
+        count('cell_writes')
+        set_value(cell, value)
+    Cell.value = property(Cell.value.fget, counted_set, doc=Cell.value.__doc__)
+
+    get_cell = Worksheet.cell
+    @functools.wraps(get_cell)
+    def counted_cell(sheet, *args, **kwargs):
+        count('cell_reads')
+        return get_cell(sheet, *args, **kwargs)
+    Worksheet.cell = counted_cell
+
+    for cls in (Worksheet, ReadOnlyWorksheet):
+        iter_rows = cls.iter_rows
+        @functools.wraps(iter_rows)
+        def counted_iter_rows(sheet, *args, _iter_rows=iter_rows, **kwargs):
+            for row in _iter_rows(sheet, *args, **kwargs):
+                count('cell_reads', len(row))
+                yield row
+        cls.iter_rows = counted_iter_rows
+    _counters_installed = True
+
+
+def counters_requested(argv, environ):
+    """True if '--diagnostics', the ATTENDER_DIAGNOSTICS variable or profiling asks for cell counts."""
+    if '--diagnostics' in argv or environ.get(DIAGNOSTICS_ENV_VAR, '0') not in ('', '0'): return True
+    return profile_path_from(argv, environ) is not None
+
+
+def counting_cells():
+    return _counters_wanted
+
+
+# --- Profiling ---
+def profile_path_from(argv, environ):
+    """The cProfile output file requested by '--profile [file]' or the ATTENDER_PROFILE variable, or None."""
+    if '--profile' in argv:
+        index = argv.index('--profile')
+        if index + 1 < len(argv) and not argv[index + 1].startswith('--'):
+            return argv[index + 1]
+        return os.path.abspath('attender.prof')
+    return environ.get(PROFILE_ENV_VAR) or None
+
+
+def start_profiling(path):
+    """Profiles the calling (Tk) thread until stop_profiling writes the stats to path."""
+    global _profiler, _profile_path
+    _profiler, _profile_path = cProfile.Profile(), path
+    _profiler.enable()
+
+
+def stop_profiling():
+    """Writes the captured profile (open it with pstats or snakeviz). Returns its path, or None."""
+    global _profiler
+    if _profiler is None: return None
+    _profiler.disable()
+    _profiler.dump_stats(_profile_path)
+    _profiler = None
+    return _profile_path
+
+
+def is_profiling():
+    return _profiler is not None
@@ -6,4 +6,96 @@ def count_student_rows(sheet):
         if sheet.cell(row=row, column=1).value is None:
             break
         count += 1
-    return count
\ No newline at end of file
+    return count
+
+SUMMARY_HEADERS = ["TOTAL HOURS", "HOURS PRESENT", "HOURS ABSENT", "PERCENTAGE"]
+
+
+class SheetSchema:
+    """Cached index of a worksheet's header rows (1-4): header -> column, date -> column,
+    the summary block and the last used column. Mutations must go through write/insert_cols/delete_cols."""
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.cells = {} # (row, col) -> value for the non-empty cells of rows 1-4
+        for row_idx, row in enumerate(sheet.iter_rows(min_row=1, max_row=4, values_only=True), start=1):
+            for col_idx, value in enumerate(row, start=1):
+                if value is not None:
+                    self.cells[(row_idx, col_idx)] = value
+        self._reindex()
+
+    def _reindex(self):
+        """Rebuilds the lookup maps from the cached header cells."""
+        self.headers = {}   # row 4 header (stripped) -> first column holding it
+        self.dates = {}     # row 2 session date -> first column holding it
+        self.session_cols = set() # columns with anything in row 2
+        self.last_col = None
+        for (row, col), value in sorted(self.cells.items(), key=lambda item: item[0][1]):
+            self._index(row, col, value)
+
+    def _index(self, row, col, value):
+        if row == 4:
+            # Headers are looked up without surrounding spaces, everywhere (columns, matrices, student index)
+            header = value.strip() if isinstance(value, str) else value
+            if header not in self.headers or col < self.headers[header]:
+                self.headers[header] = col
+        if row == 2 and col >= 4:
+            self.session_cols.add(col)
+            if isinstance(value, str) and '-' in value and (value not in self.dates or col < self.dates[value]):
+                self.dates[value] = col
+        if row != 2 and col >= 4:
+            self.last_col = max(self.last_col or 0, col)
+
+    def write(self, row, col, value):
+        """Writes a header-row cell to the sheet and keeps the index in step."""
+        self.sheet.cell(row=row, column=col).value = value
+        old_value = self.cells.pop((row, col), None)
+        if value is not None:
+            self.cells[(row, col)] = value
+        if old_value is not None:
+            # Another column may now be the first holder of the old value, so rebuild
+            self._reindex()
+        elif value is not None:
+            self._index(row, col, value)
+
+    def insert_cols(self, idx, amount=1):
+        """Inserts columns in the sheet and shifts every cached column at or after idx."""
+        self.sheet.insert_cols(idx=idx, amount=amount)
+        self.cells = {(row, col + amount if col >= idx else col): value for (row, col), value in self.cells.items()}
+        self._reindex()
+
+    def delete_cols(self, idx, amount=1):
+        """Deletes columns from the sheet and shifts every cached column after them."""
+        self.sheet.delete_cols(idx, amount)
+        self.cells = {(row, col - amount if col >= idx + amount else col): value
+                      for (row, col), value in self.cells.items() if not idx <= col < idx + amount}
+        self._reindex()
+
+    def col(self, header):
+        """Returns the column of a row-4 header, or None."""
+        return self.headers.get(header)
+
+    def value(self, row, col):
+        return self.cells.get((row, col))
+
+    def true_last_column(self):
+        """The last column with data in rows 1, 3 or 4; 26 (end of the summary block) if there is none."""
+        return self.last_col or 26
+
+    def summary_cols(self):
+        """Maps each summary header that is present to its column."""
+        return {header: self.headers[header] for header in SUMMARY_HEADERS if header in self.headers}
+
+    def next_session_col(self):
+        """The first column from D onwards with an empty date cell."""
+        col = 4
+        while col in self.session_cols:
+            col += 1
+        return col
+
+    def session_dates(self):
+        """All unique session dates in column order."""
+        return sorted(self.dates, key=self.dates.get)
+
+    def assessment_cols(self):
+        """Assessment header -> column, for headers after the fixed summary block that carry an 'Out of' value."""
+        return {header: col for header, col in self.headers.items() if col >= 27 and self.cells.get((3, col))}
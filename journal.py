@@ -0,0 +1,81 @@
+import os
+import json
+import threading
+from config import JOURNAL_FSYNC
+import diagnostics
+
+# Custom document property of the .xlsx holding the last journal entry it already contains
+CHECKPOINT_PROPERTY = "AttenderJournalSeq"
+
+
+def journal_path_for(xlsx_path):
+    """The journal file that sits next to a workbook (Class.xlsx -> Class.journal)."""
+    return os.path.splitext(xlsx_path)[0] + '.journal'
+
+
+def read_checkpoint(wb):
+    """The journal sequence number stamped into a workbook by its last save, or 0."""
+    if wb is None or CHECKPOINT_PROPERTY not in wb.custom_doc_props.names: return 0
+    try:
+        return int(wb.custom_doc_props[CHECKPOINT_PROPERTY].value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def write_checkpoint(wb, seq):
+    from openpyxl.packaging.custom import IntProperty
+    if CHECKPOINT_PROPERTY in wb.custom_doc_props.names:
+        wb.custom_doc_props[CHECKPOINT_PROPERTY].value = seq
+    else:
+        wb.custom_doc_props.append(IntProperty(name=CHECKPOINT_PROPERTY, value=seq))
+
+
+class Journal:
+    """Append-only JSON-lines log of the changes made to one workbook since its last save.
+    Each line is {"seq", "op", "sheet", "args", "kwargs"}; a save stamps the workbook with the
+    last seq it contains and empties the file, and load replays whatever is newer than the stamp."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock() # appends come from the app, truncation from the saver
+        entries = self.entries()
+        self.seq = entries[-1]['seq'] if entries else 0
+
+    def entries(self, after_seq=0):
+        """All complete entries with a sequence number above after_seq."""
+        if not os.path.exists(self.path): return []
+        entries = []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break # A torn last line from a crash mid-append
+                if entry['seq'] > after_seq:
+                    entries.append(entry)
+        return entries
+
+    def append(self, op, sheet, args, kwargs):
+        """Records one change; it is on disk (in the OS cache, or fsynced if configured) when this returns."""
+        with self._lock:
+            self.seq += 1
+            line = json.dumps({"seq": self.seq, "op": op, "sheet": sheet, "args": args, "kwargs": kwargs}, separators=(',', ':'))
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                if JOURNAL_FSYNC:
+                    os.fsync(f.fileno())
+        diagnostics.count('bytes_written', len(line.encode('utf-8')) + 1)
+        return self.seq
+
+    def truncate(self, upto=None):
+        """Drops the entries up to seq upto (all of them by default) once a saved workbook holds them.
+        Entries appended while that save was being written are kept."""
+        with self._lock:
+            newer = self.entries(upto) if upto is not None and upto < self.seq else []
+            if newer:
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry, separators=(',', ':')) + '\n' for entry in newer)
+                os.replace(tmp_path, self.path)
+            elif os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,241 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import diagnostics
+from config import LIVE_API_URL, LIVE_POLL_MIN, LIVE_POLL_MAX, LIVE_POLL_BACKOFF, LIVE_HTTP_WORKERS, LIVE_RETRY_ATTEMPTS
+
+
+class _SessionState:
+    """What the client last saw of one OTP session."""
+    def __init__(self):
+        self.present, self.seen = [], set()
+        self.etag, self.cursor, self.active = None, None, True
+
+
+class LiveClient:
+    """Client for the OTP attendance API over one pooled keep-alive HTTP session, shared by every
+    live session of the app (each OTP keeps its own list, ETag and cursor).
+
+    get_present_list only asks for what changed: it sends the ETag of the last answer (the server
+    replies 304 Not Modified if nothing changed) and the cursor of the last roll it saw (a server
+    that supports it then returns only the rolls added since, in 'added'). A server that supports
+    neither just returns the full list every time, so the client works with both."""
+    def __init__(self, base_url=LIVE_API_URL, timeout=5, pool_size=LIVE_HTTP_WORKERS):
+        import requests # Slow to import; loaded only once a live session starts
+        from requests.adapters import HTTPAdapter
+        self.base_url = base_url.rstrip('/') + '/'
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        self._lock = threading.Lock()
+        self._sessions = {} # otp -> _SessionState
+        self.requests = self.not_modified = self.bytes_received = 0 # for diagnostics and benchmarks
+
+    def _received(self, response):
+        with self._lock:
+            self.requests += 1
+            # Content-Length is the size on the wire (compressed); response.content is already decoded
+            self.bytes_received += int(response.headers.get('Content-Length') or len(response.content))
+
+    def forget(self, otp):
+        """Drops what the client remembers of a session."""
+        with self._lock:
+            self._sessions.pop(otp, None)
+
+    def start_session(self, subject, valid_rolls, teacher="default_teacher"):
+        """Starts a session on the server and returns its JSON reply ({'status', 'otp', ...})."""
+        payload = {"teacher_username": teacher, "subject_name": subject, "valid_rolls": valid_rolls}
+        response = self.session.post(self.base_url + "start-session/", json=payload, timeout=10)
+        self._received(response)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('otp') is not None:
+            with self._lock:
+                self._sessions[data['otp']] = _SessionState()
+        return data
+
+    @diagnostics.timed("live.get_present_list")
+    def get_present_list(self, otp, full=False):
+        """Returns (present rolls, is_active, changed). full=True skips the ETag and cursor and
+        fetches the whole list (e.g. the final list when the session is finished); it raises if
+        the server does not return one."""
+        headers, params = {}, {"otp": otp}
+        with self._lock:
+            state = self._sessions.setdefault(otp, _SessionState())
+            if not full:
+                if state.etag: headers["If-None-Match"] = state.etag
+                if state.cursor is not None: params["since"] = state.cursor
+        response = self.session.get(self.base_url + "get-present-list/", params=params, headers=headers, timeout=self.timeout)
+        self._received(response)
+        with self._lock:
+            if response.status_code == 304:
+                self.not_modified += 1
+                return list(state.present), state.active, False
+            response.raise_for_status()
+            data = response.json()
+            if data.get('status') != 'success':
+                # The final list must not quietly fall back to the last poll; the caller retries or reports it
+                if full: raise RuntimeError(data.get('message') or "The server did not return the present list.")
+                return list(state.present), state.active, False
+            old = state.present
+            if 'added' in data and 'since' in params:
+                present = old + [roll for roll in data['added'] if roll not in state.seen]
+            else:
+                present = list(data.get('present_students', []))
+            state.present, state.seen = present, set(present)
+            state.cursor = data.get('cursor')
+            state.etag = response.headers.get('ETag')
+            state.active = data.get('is_active', True)
+            return list(present), state.active, present != old
+
+    def finish_session(self, otp):
+        self.forget(otp)
+        response = self.session.post(self.base_url + "finish-session/", json={'otp': otp}, timeout=3)
+        self._received(response)
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class _Watch:
+    def __init__(self, otp, on_update, on_expired, on_error, checkpoint):
+        self.otp = otp
+        self.on_update, self.on_expired, self.on_error = on_update, on_expired, on_error
+        self.checkpoint = checkpoint
+        self.watching = True # cleared by unwatch(), so no callback reaches a closed window
+        self.task = None
+
+
+class LiveSessionManager:
+    """Polls every active OTP session of the app from one background asyncio loop.
+
+    Each watched session is a task on the loop; its wait between polls starts at min_interval,
+    grows towards max_interval while nothing changes and doubles (up to max_backoff) after errors.
+    The HTTP calls themselves are blocking requests calls, so they run on a small shared pool of
+    workers over one LiveClient (one connection pool), however many sessions are open. Callbacks
+    are wrapped and handed to dispatch(callback), e.g. a Tk after(0, callback), and never run
+    after unwatch()."""
+    def __init__(self, dispatch, client=None, workers=LIVE_HTTP_WORKERS,
+                 min_interval=LIVE_POLL_MIN, max_interval=LIVE_POLL_MAX, max_backoff=LIVE_POLL_BACKOFF):
+        self.dispatch = dispatch
+        self.client = client or LiveClient(pool_size=workers)
+        self.min_interval, self.max_interval, self.max_backoff = min_interval, max_interval, max_backoff
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="live-http")
+        self._watches = {} # otp -> _Watch
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="live-sessions", daemon=True)
+        self._thread.start()
+
+    def watch(self, otp, on_update, on_expired=None, on_error=None, checkpoint=None):
+        """Starts polling a session: on_update(present rolls) when the list changes, on_expired() once it ends,
+        on_error(error) when a poll fails. checkpoint(present rolls), if given, runs on the worker pool after
+        every poll that changed the list; its failures go to on_error too."""
+        watch = _Watch(otp, on_update, on_expired, on_error, checkpoint)
+        self.unwatch(otp)
+        with self._lock:
+            self._watches[otp] = watch
+        self._loop.call_soon_threadsafe(self._start, watch)
+
+    def unwatch(self, otp):
+        """Stops polling a session at once; a poll already in flight is discarded."""
+        with self._lock:
+            watch = self._watches.pop(otp, None)
+        if watch is None: return
+        watch.watching = False
+        self._loop.call_soon_threadsafe(self._cancel, watch)
+
+    def finish(self, otp, on_error=None):
+        """Stops polling and tells the server the session is over, retrying in the background.
+        on_error(last error) is handed to dispatch if every attempt fails."""
+        self.unwatch(otp)
+        self.run(self.client.finish_session, otp, attempts=LIVE_RETRY_ATTEMPTS, on_error=on_error)
+
+    def run(self, func, *args, attempts=1, on_done=None, on_error=None, on_retry=None):
+        """Calls func(*args) on the worker pool, off the GUI thread. Failures are retried up to 'attempts'
+        times in all, waiting 1, 2, 4... seconds; on_done(result), on_retry(attempt, error) and
+        on_error(last error) are handed to dispatch."""
+        return asyncio.run_coroutine_threadsafe(self._run(func, args, attempts, on_done, on_error, on_retry), self._loop)
+
+    def active_sessions(self):
+        with self._lock:
+            return list(self._watches)
+
+    def shutdown(self):
+        """Stops every poll and the loop; calls already running on the worker pool still finish."""
+        for otp in self.active_sessions():
+            self.unwatch(otp)
+        self._loop.call_soon_threadsafe(self._close)
+        self._executor.submit(self.client.close)
+        self._executor.shutdown(wait=False)
+
+    def _send(self, watch, callback, *args):
+        """Hands a callback to the GUI thread, dropping it if the session was unwatched meanwhile."""
+        if callback is None or not watch.watching: return
+        self.dispatch(lambda: watch.watching and callback(*args))
+
+    # --- Runs on the loop thread ---
+    def _start(self, watch):
+        if watch.watching:
+            watch.task = self._loop.create_task(self._poll(watch))
+
+    def _cancel(self, watch):
+        if watch.task is not None:
+            watch.task.cancel()
+
+    def _close(self):
+        # Pending retries are cancelled too; the loop stops once the tasks have seen it
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
+        self._loop.call_soon(self._loop.stop)
+
+    async def _run(self, func, args, attempts, on_done, on_error, on_retry):
+        delay = 1
+        for attempt in range(1, attempts + 1):
+            try:
+                result = await self._loop.run_in_executor(self._executor, functools.partial(func, *args))
+            except Exception as e:
+                if attempt == attempts:
+                    if on_error: self.dispatch(functools.partial(on_error, e))
+                    return None
+                if on_retry: self.dispatch(functools.partial(on_retry, attempt, e))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+            else:
+                if on_done: self.dispatch(functools.partial(on_done, result))
+                return result
+
+    async def _poll(self, watch):
+        interval, failures = self.min_interval, 0
+        while watch.watching:
+            try:
+                present, active, changed = await self._loop.run_in_executor(self._executor, self.client.get_present_list, watch.otp)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e: # Connection errors, timeouts, bad replies
+                failures += 1
+                interval = min(self.max_backoff, self.min_interval * 2 ** failures)
+                self._send(watch, watch.on_error, e)
+            else:
+                failures = 0
+                if changed and watch.checkpoint:
+                    try:
+                        await self._loop.run_in_executor(self._executor, watch.checkpoint, present)
+                    except Exception as e:
+                        self._send(watch, watch.on_error, e)
+                if changed:
+                    self._send(watch, watch.on_update, present)
+                    interval = self.min_interval
+                else:
+                    interval = min(self.max_interval, interval * 1.5)
+                if not active:
+                    self._send(watch, watch.on_expired)
+                    with self._lock:
+                        if self._watches.get(watch.otp) is watch:
+                            del self._watches[watch.otp]
+                    return
+            await asyncio.sleep(interval)
@@ -0,0 +1,73 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from config import LIVE_STORE_FILENAME
+
+
+class LiveSessionStore:
+    """Local checkpoint (LIVE_STORE_FILENAME in the data folder) of every live session that has not
+    been saved to its sheet yet: the OTP, workbook, subject, date, hours and the last present list
+    the server returned. It survives a lost connection or a crash, so the attendance collected so
+    far can still be written with mark_attendance. Entries are removed once they are saved."""
+    def __init__(self, data_path):
+        self.path = os.path.join(data_path, LIVE_STORE_FILENAME)
+        self._lock = threading.Lock()
+        self._entries = self._read()
+        self._claimed = set() # OTPs of sessions still open in a window of this app
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def start(self, otp, filename, subject, date_str, hours):
+        """Records a session that has just started on the server."""
+        with self._lock:
+            self._claimed.add(otp)
+            self._entries[otp] = {"otp": otp, "file": filename, "subject": subject, "date": date_str,
+                                  "hours": hours, "present": [], "updated": time.time()}
+            with contextlib.suppress(OSError):
+                self._write()
+
+    def update(self, otp, present):
+        """Checkpoints the latest present list of a session (called from the polling workers)."""
+        with self._lock:
+            entry = self._entries.get(otp)
+            if entry is None: return
+            entry["present"], entry["updated"] = list(present), time.time()
+            with contextlib.suppress(OSError):
+                self._write()
+
+    def get(self, otp):
+        with self._lock:
+            entry = self._entries.get(otp)
+            return dict(entry) if entry else None
+
+    def release(self, otp):
+        """Called when the window of a session closes; an unsaved session then shows up in pending()."""
+        with self._lock:
+            self._claimed.discard(otp)
+
+    def remove(self, otp):
+        with self._lock:
+            if self._entries.pop(otp, None) is not None:
+                with contextlib.suppress(OSError):
+                    self._write()
+
+    def pending(self, filename, subject):
+        """The unsaved sessions of one subject sheet that no open window owns, oldest first."""
+        with self._lock:
+            entries = [dict(entry) for otp, entry in self._entries.items()
+                       if entry["file"] == filename and entry["subject"] == subject and otp not in self._claimed]
+        return sorted(entries, key=lambda entry: entry["updated"])
@@ -0,0 +1,184 @@
+# Local stand-in for the OTP attendance API, for trying live sessions and load-testing the
+# polling client without the real server:
+#
+#     python mock_server.py --port 8765 --simulate 3      # three students join per second
+#     ATTENDER_API_URL=http://127.0.0.1:8765/attendance/api/ python main.py
+#
+# It serves start-session/, get-present-list/ (with the ETag and 'since' cursor that
+# live_client.py uses), finish-session/ and, to mark students by hand, mark/ {otp, roll}.
+# Sessions live in memory only and expire after --ttl seconds.
+
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+API_PREFIX = "/attendance/api/"
+
+
+class MockSession:
+    def __init__(self, otp, subject, valid_rolls, ttl):
+        self.otp = otp
+        self.subject = subject
+        self.valid_rolls = list(valid_rolls)
+        self.marked = [] # rolls in the order they joined; a cursor is a position in this list
+        self.expires = time.time() + ttl
+        self.finished = False
+
+    def is_active(self):
+        return not self.finished and time.time() < self.expires
+
+    def etag(self):
+        return f'"{self.otp}-{len(self.marked)}-{int(self.is_active())}"'
+
+
+class MockAttendanceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, ttl=300):
+        super().__init__(address, MockRequestHandler)
+        self.ttl = ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start_session(self, subject, valid_rolls):
+        with self.lock:
+            otp = f"{random.randrange(10 ** 6):06d}"
+            while otp in self.sessions:
+                otp = f"{random.randrange(10 ** 6):06d}"
+            self.sessions[otp] = MockSession(otp, subject, valid_rolls, self.ttl)
+            return otp
+
+    def mark(self, otp, roll):
+        """Marks a student present, as if they had entered the OTP; False if the session or roll is not valid."""
+        with self.lock:
+            session = self.sessions.get(otp)
+            if session is None or not session.is_active() or roll not in session.valid_rolls: return False
+            if roll not in session.marked:
+                session.marked.append(roll)
+            return True
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, data=None, headers=None):
+        body = b'' if data is None else json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body and len(body) > 512 and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        if data is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        self.server.requests += 1
+        url = urlsplit(self.path)
+        if url.path != API_PREFIX + "get-present-list/":
+            return self._reply(404, {"status": "error", "message": "Not found."})
+        query = parse_qs(url.query)
+        otp = query.get('otp', [''])[0]
+        with self.server.lock:
+            session = self.server.sessions.get(otp)
+            if session is None:
+                return self._reply(404, {"status": "error", "message": "Invalid OTP."})
+            etag = session.etag()
+            if self.headers.get('If-None-Match') == etag:
+                return self._reply(304, headers={"ETag": etag})
+            data = {"status": "success", "is_active": session.is_active(), "cursor": len(session.marked)}
+            since = query.get('since', [None])[0]
+            if since is not None and since.isdigit() and int(since) <= len(session.marked):
+                data["added"] = session.marked[int(since):]
+            else:
+                data["present_students"] = list(session.marked)
+        self._reply(200, data, {"ETag": etag})
+
+    def do_POST(self):
+        self.server.requests += 1
+        path, data = urlsplit(self.path).path, self._json_body()
+        if path == API_PREFIX + "start-session/":
+            otp = self.server.start_session(data.get('subject_name'), data.get('valid_rolls') or [])
+            return self._reply(200, {"status": "success", "otp": otp})
+        if path == API_PREFIX + "finish-session/":
+            with self.server.lock:
+                session = self.server.sessions.get(data.get('otp'))
+                if session is not None: session.finished = True
+            return self._reply(200, {"status": "success"} if session else {"status": "error", "message": "Invalid OTP."})
+        if path == API_PREFIX + "mark/":
+            if self.server.mark(data.get('otp'), data.get('roll')):
+                return self._reply(200, {"status": "success"})
+            return self._reply(400, {"status": "error", "message": "Invalid OTP or roll number."})
+        self._reply(404, {"status": "error", "message": "Not found."})
+
+
+def start_server(host="127.0.0.1", port=0, ttl=300):
+    """Starts the server on a background thread (port 0 picks a free port); returns it."""
+    server = MockAttendanceServer((host, port), ttl)
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server
+
+
+def simulate_students(server, rate, stop, seed=0):
+    """Until stop (an Event) is set, marks about 'rate' random unmarked students per second in every active session."""
+    rng = random.Random(seed)
+    while not stop.wait(1 / rate):
+        with server.lock:
+            waiting = {}
+            for session in server.sessions.values():
+                if not session.is_active(): continue
+                marked = set(session.marked)
+                waiting[session.otp] = [roll for roll in session.valid_rolls if roll not in marked]
+        for otp, rolls in waiting.items():
+            if rolls: server.mark(otp, rng.choice(rolls))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the OTP attendance API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttl", type=int, default=300, help="seconds an OTP stays valid")
+    parser.add_argument("--simulate", type=float, default=0, help="students per second who join each active session")
+    args = parser.parse_args(argv)
+
+    server = start_server(args.host, args.port, args.ttl)
+    print(f"Serving the attendance API at {server.base_url} (Ctrl+C to stop)", file=sys.stderr)
+    stop = threading.Event()
+    if args.simulate > 0:
+        threading.Thread(target=simulate_students, args=(server, args.simulate, stop), daemon=True).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import os
+import threading
+import contextlib
+from config import SAVE_DEBOUNCE_MS, SAVE_ATTEMPTS
+import diagnostics
+
+
+def write_temp(wb, path):
+    """Serializes a workbook to a temp file next to path and fsyncs it; returns the temp path."""
+    tmp_path = path + '.tmp'
+    try:
+        wb.save(tmp_path)
+        with open(tmp_path, 'rb+') as f:
+            os.fsync(f.fileno())
+    except BaseException:
+        discard_temp(tmp_path)
+        raise
+    diagnostics.count('bytes_written', os.path.getsize(tmp_path))
+    return tmp_path
+
+
+def discard_temp(tmp_path):
+    with contextlib.suppress(OSError):
+        os.remove(tmp_path)
+
+
+def sync_directory(path):
+    """Makes a rename into path's folder durable (not possible, or needed, on Windows)."""
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def atomic_save(wb, path):
+    """Serializes a workbook to a temp file next to path, fsyncs it and renames it over path,
+    so a crash mid-save leaves the previous file intact."""
+    tmp_path = write_temp(wb, path)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard_temp(tmp_path)
+        raise
+    sync_directory(path)
+
+
+class WriteBehindSaver:
+    """Coalesces workbook saves: mutations mark the workbook dirty and one save runs per debounce window.
+    Scheduled saves run on a background writer thread; flush() saves on the calling thread.
+
+    Background saves only hold the lock to start and to finish, not while the workbook is serialized
+    and synced, so the app stays responsive. Changes call begin_change() (under the lock) before touching
+    the workbook; a save that overlapped one drops its temp file and starts over. A save that still
+    fails is tried again after the debounce delay, so changes are never left waiting for the next edit."""
+    def __init__(self, get_workbook, get_path, schedule=None, cancel=None, on_error=None, on_status=None,
+                 debounce_ms=SAVE_DEBOUNCE_MS, lock=None, before_save=None, after_save=None):
+        self.get_workbook = get_workbook
+        self.get_path = get_path
+        # before_save(workbook) runs under the lock just before the workbook is written; whatever it
+        # returns is passed to after_save(token) once the write succeeded and the lock is released
+        self.before_save = before_save
+        self.after_save = after_save
+        # Both callbacks may be called from the writer thread, never under the lock; the GUI only queues them (post)
+        self.on_error = on_error
+        self.on_status = on_status
+        # Held while a save checks what to write and while it replaces the file
+        self.lock = lock or contextlib.nullcontext()
+        self.debounce_ms = debounce_ms
+        # The GUI passes Tk's after/after_cancel; headless callers fall back to a timer thread.
+        self._schedule = schedule or self._timer_schedule
+        self._cancel = cancel or self._timer_cancel
+        self._pending = None
+        self.dirty = False
+        self.generation = 0 # bumped by every change, so a save can tell if the workbook moved under it
+        self._io_lock = threading.Lock() # one writer at a time, whichever thread it is on
+        self._wake = threading.Event()
+        self._announce = False
+        self._writer = None
+
+    def _timer_schedule(self, delay_ms, callback):
+        timer = threading.Timer(delay_ms / 1000, callback)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _timer_cancel(self, timer):
+        timer.cancel()
+
+    def begin_change(self):
+        """Called under the lock before the workbook is changed."""
+        self.generation += 1
+
+    def mark_dirty(self):
+        """Records an unsaved change and schedules a save if one is not already pending."""
+        self.dirty = True
+        if self._pending is None:
+            self._pending = self._schedule(self.debounce_ms, self._on_timer)
+
+    def _on_timer(self):
+        self._pending = None
+        self.save_async()
+
+    def save_async(self, announce=False):
+        """Hands the save to the writer thread and returns at once.
+        With announce, progress and success are reported through on_status too, not only errors."""
+        self.cancel_pending()
+        self._announce = self._announce or announce
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._writer_loop, name="workbook-writer", daemon=True)
+            self._writer.start()
+        self._wake.set()
+
+    def _writer_loop(self):
+        retry = None # seconds until a failed save is tried again
+        while True:
+            self._wake.wait(retry)
+            self._wake.clear()
+            announce, self._announce = self._announce, False
+            success, message = self._write(announce)
+            # The writer times its own retry: scheduling through the GUI from this thread could block
+            retry = self.debounce_ms / 1000 if not success and self.dirty else None
+            if not success and self.on_error:
+                self.on_error(message)
+            elif announce and self.on_status:
+                self.on_status(message)
+
+    def cancel_pending(self):
+        if self._pending is not None:
+            self._cancel(self._pending)
+            self._pending = None
+
+    def discard(self):
+        """Forgets any unsaved changes (used when the workbook is replaced)."""
+        self.cancel_pending()
+        self.generation += 1 # a save in progress must not write the old workbook over the new file
+        self.dirty = False
+
+    def flush(self):
+        """Writes the workbook now if it has unsaved changes, on the calling thread and holding the lock
+        (after any background save finishes). Returns (success, message)."""
+        self.cancel_pending()
+        return self._write(hold_lock=True)
+
+    @diagnostics.timed("save")
+    def _write(self, announce=False, hold_lock=False):
+        with self._io_lock:
+            for attempt in range(1, SAVE_ATTEMPTS + 1):
+                # The last try keeps the workbook still, so a stream of changes cannot starve the save
+                result = self._write_once(announce and attempt == 1, hold_lock or attempt == SAVE_ATTEMPTS)
+                if result is not None:
+                    break
+            else:
+                return False, "The workbook kept changing while it was being saved."
+        success, message, saved = result
+        if saved is not None:
+            saved()
+        return success, message
+
+    def _write_once(self, announce, hold_lock):
+        """One try at a save. Returns (success, message, after_save call to make once the locks are released
+        or None), or None if the workbook changed meanwhile or could not be serialized alongside a change."""
+        with self.lock:
+            if not self.dirty:
+                return True, "No unsaved changes.", None
+            wb, path = self.get_workbook(), self.get_path()
+            if wb is None or not path:
+                self.dirty = False
+                return True, "No workbook to save.", None
+            generation, name = self.generation, os.path.basename(path)
+            try:
+                token = self.before_save(wb) if self.before_save else None
+            except Exception as e:
+                return False, f"An error occurred while saving: {e}", None
+        if announce and self.on_status:
+            self.on_status(f"Saving '{name}'...")
+        tmp_path = None
+        try:
+            with self.lock if hold_lock else contextlib.nullcontext():
+                tmp_path = write_temp(wb, path)
+                with self.lock:
+                    if self.generation != generation:
+                        discard_temp(tmp_path)
+                        return None
+                    os.replace(tmp_path, path)
+                    self.dirty = False
+            sync_directory(path)
+            return True, f"Saved '{name}'.", (lambda: self.after_save(token)) if self.after_save else None
+        except PermissionError:
+            if tmp_path: discard_temp(tmp_path)
+            return False, f"Could not save. '{name}' is open.", None
+        except Exception as e:
+            if tmp_path: discard_temp(tmp_path)
+            if tmp_path is None and not hold_lock:
+                return None # Serializing raced a read or change (e.g. a dict resized mid-iteration)
+            return False, f"An error occurred while saving: {e}", None
@@ -0,0 +1,430 @@
+import os
+import sys
+import sqlite3
+import contextlib
+from config import USER_DATA_PATH
+from attendance_matrix import PRESENT, ABSENT, number, format_mark
+import styles
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+    serial INTEGER NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    roll TEXT NOT NULL DEFAULT '',
+    final_result TEXT,
+    UNIQUE (subject_id, serial)
+);
+CREATE INDEX IF NOT EXISTS students_by_name ON students (subject_id, name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    hours INTEGER NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_date ON sessions (subject_id, date);
+CREATE TABLE IF NOT EXISTS attendance (
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    status INTEGER NOT NULL,
+    PRIMARY KEY (session_id, student_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS attendance_by_student ON attendance (student_id);
+CREATE TABLE IF NOT EXISTS assessments (
+    id INTEGER PRIMARY KEY,
+    subject_id INTEGER NOT NULL REFERENCES subjects(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    max_marks INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    UNIQUE (subject_id, name)
+);
+CREATE TABLE IF NOT EXISTS marks (
+    assessment_id INTEGER NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    mark REAL NOT NULL,
+    PRIMARY KEY (assessment_id, student_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def db_path_for(xlsx_path):
+    """The database file that sits next to a workbook (Class.xlsx -> Class.db)."""
+    return os.path.splitext(xlsx_path)[0] + '.db'
+
+
+class SqliteStore:
+    """Optional transactional store for one workbook's subjects, students, sessions and marks.
+    Every operation is a single SQLite transaction, so nothing is ever rewritten wholesale;
+    the formatted .xlsx is produced on demand by export_xlsx. The app itself still works on the
+    .xlsx files; the store is filled and read back only through import_workbook and export_xlsx."""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _subject_id(self, subject):
+        row = self.conn.execute("SELECT id FROM subjects WHERE name = ?", (subject,)).fetchone()
+        if row is None: raise KeyError(f"Subject '{subject}' does not exist.")
+        return row[0]
+
+    def _session_id(self, subject_id, date_str):
+        row = self.conn.execute("SELECT id FROM sessions WHERE subject_id = ? AND date = ?", (subject_id, date_str)).fetchone()
+        return row[0] if row else None
+
+    # --- Subjects and roster ---
+    def get_subjects(self):
+        return [name for (name,) in self.conn.execute("SELECT name FROM subjects ORDER BY position")]
+
+    def add_subject(self, name):
+        """Creates a new, empty subject."""
+        try:
+            with self.conn:
+                self.conn.execute("INSERT INTO subjects (name, position) VALUES (?, (SELECT COUNT(*) FROM subjects))", (name,))
+        except sqlite3.IntegrityError:
+            return False, f"A subject named '{name}' already exists."
+        return True, f"Subject '{name}' was created."
+
+    def get_roster(self, subject):
+        """Returns the (names, complex rolls) lists of a subject in roll number order."""
+        rows = self.conn.execute("SELECT name, roll FROM students WHERE subject_id = ? ORDER BY serial", (self._subject_id(subject),)).fetchall()
+        return [name for name, _ in rows], [roll for _, roll in rows]
+
+    def update_students(self, subject, student_names, student_rolls):
+        """Replaces the student list of a subject. Attendance and marks stay with the same roll numbers."""
+        subject_id = self._subject_id(subject)
+        with self.conn:
+            self.conn.execute("DELETE FROM students WHERE subject_id = ? AND serial > ?", (subject_id, len(student_names)))
+            self.conn.executemany(
+                "INSERT INTO students (subject_id, serial, name, roll) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (subject_id, serial) DO UPDATE SET name = excluded.name, roll = excluded.roll",
+                [(subject_id, i + 1, name, roll) for i, (name, roll) in enumerate(zip(student_names, student_rolls))])
+        return True, f"Student list for '{subject}' updated."
+
+    def get_student_list(self, subject):
+        """Gets a list of all student names of a subject."""
+        return [name for name in self.get_roster(subject)[0] if name]
+
+    def get_complex_rolls(self, subject):
+        return [roll for roll in self.get_roster(subject)[1] if roll]
+
+    # --- Attendance ---
+    def get_all_dates(self, subject):
+        return [date for (date,) in self.conn.execute(
+            "SELECT date FROM sessions WHERE subject_id = ? ORDER BY position", (self._subject_id(subject),))]
+
+    def mark_attendance(self, subject, absent_list, num_hours, attendance_date):
+        """Records a session for every student of the subject; an existing session on that date is replaced."""
+        try:
+            hours = int(num_hours)
+        except (ValueError, TypeError):
+            return False, "Session hours must be a number."
+        try:
+            subject_id = self._subject_id(subject)
+            absent = set(absent_list)
+            with self.conn:
+                session_id = self._session_id(subject_id, attendance_date)
+                if session_id is None:
+                    session_id = self.conn.execute(
+                        "INSERT INTO sessions (subject_id, date, hours, position) "
+                        "VALUES (?, ?, ?, (SELECT COUNT(*) FROM sessions WHERE subject_id = ?))",
+                        (subject_id, attendance_date, hours, subject_id)).lastrowid
+                else:
+                    self.conn.execute("UPDATE sessions SET hours = ? WHERE id = ?", (hours, session_id))
+                students = self.conn.execute("SELECT id, serial FROM students WHERE subject_id = ?", (subject_id,)).fetchall()
+                self.conn.executemany("INSERT OR REPLACE INTO attendance (session_id, student_id, status) VALUES (?, ?, ?)",
+                                      [(session_id, student_id, ABSENT if serial in absent else PRESENT) for student_id, serial in students])
+            return True, "Attendance marked and summary updated!"
+        except Exception as e: return False, f"An error occurred: {e}"
+
+    def _summaries(self, subject_id):
+        """(serial, name, total, present) for every student; totals count every session of the subject."""
+        total = self.conn.execute("SELECT COALESCE(SUM(hours), 0) FROM sessions WHERE subject_id = ?", (subject_id,)).fetchone()[0]
+        rows = self.conn.execute(
+            "SELECT st.serial, st.name, COALESCE(SUM(se.hours), 0) FROM students st "
+            "LEFT JOIN attendance a ON a.student_id = st.id AND a.status = ? "
+            "LEFT JOIN sessions se ON se.id = a.session_id "
+            "WHERE st.subject_id = ? GROUP BY st.id ORDER BY st.serial", (PRESENT, subject_id)).fetchall()
+        return [(serial, name, total, present) for serial, name, present in rows]
+
+    def get_report_by_date(self, subject, dates_list):
+        """Generates a summary of attendance for a list of dates."""
+        if not dates_list:
+            return ["Please select at least one date."]
+        subject_id = self._subject_id(subject)
+        report_lines = []
+        for date_str in dates_list:
+            row = self.conn.execute(
+                "SELECT se.hours, SUM(a.status = ?), SUM(a.status = ?) FROM sessions se "
+                "LEFT JOIN attendance a ON a.session_id = se.id WHERE se.subject_id = ? AND se.date = ? GROUP BY se.id",
+                (PRESENT, ABSENT, subject_id, date_str)).fetchone()
+            if row is None:
+                report_lines.append(f"Date '{date_str}' not found.")
+                continue
+            hours, present_count, absent_count = row[0], row[1] or 0, row[2] or 0
+            total = present_count + absent_count
+            report_lines.append(
+                f"Subject: {subject}\n"
+                f"Report for {date_str}(Session Hours: {hours}):\n"
+                f"  - Present: {present_count} / {total}\n"
+                f"  - Absent: {absent_count} / {total}"
+            )
+        return report_lines
+
+    def get_low_attendance_students(self, subject, threshold_percent):
+        """Gets a list of students below a certain attendance percentage."""
+        low_attendance_students = []
+        for _, name, total, present in self._summaries(self._subject_id(subject)):
+            if not name or total <= 0: continue
+            percentage = round(present / total * 100, 2)
+            if percentage < threshold_percent:
+                low_attendance_students.append(f"{name} ({percentage:.2f}%)")
+        return low_attendance_students
+
+    def get_report_by_name(self, subject, names_list):
+        """Generates a summary including attendance, marks, and final result."""
+        subject_id = self._subject_id(subject)
+        summaries = {name.upper(): (serial, total, present) for serial, name, total, present in self._summaries(subject_id) if name}
+        assessments = self.get_assessment_list(subject)
+        report_lines = []
+        for name in names_list:
+            if name.upper() not in summaries:
+                report_lines.append(f"{name}:\n  - STUDENT NOT FOUND")
+                continue
+            serial, total, present = summaries[name.upper()]
+            percentage = (present / total * 100) if total > 0 else 0
+            line = f"{name}: In subject ({subject})"
+            line += f"\n  - Hours Present: {present}\n  - Hours Absent: {total - present}\n  - Percentage: {percentage:.2f}%"
+            marks = self.conn.execute(
+                "SELECT a.name, a.max_marks, m.mark FROM marks m JOIN assessments a ON a.id = m.assessment_id "
+                "JOIN students st ON st.id = m.student_id WHERE st.subject_id = ? AND st.serial = ? ORDER BY a.name",
+                (subject_id, serial)).fetchall()
+            if assessments:
+                line += "\n  --- Marks ---"
+                for assessment_name, max_marks, mark in marks:
+                    line += f"\n  - {assessment_name}: {format_mark(mark)}/{max_marks}"
+            final_mark = self.conn.execute("SELECT final_result FROM students WHERE subject_id = ? AND serial = ?", (subject_id, serial)).fetchone()[0]
+            line += "\n  --- Final Result ---"
+            line += f"\n  - FINAL RESULT: {final_mark if final_mark is not None else 'Not Calculated'}"
+            report_lines.append(line)
+        return report_lines
+
+    # --- Assessments and marks ---
+    def get_assessment_list(self, subject):
+        return sorted(name for (name,) in self.conn.execute("SELECT name FROM assessments WHERE subject_id = ?", (self._subject_id(subject),)))
+
+    def get_max_marks(self, subject, assessment_name):
+        row = self.conn.execute("SELECT max_marks FROM assessments WHERE subject_id = ? AND name = ?",
+                                (self._subject_id(subject), assessment_name.upper())).fetchone()
+        return row[0] if row else None
+
+    def add_new_assessment(self, subject, name, max_marks):
+        """Adds a new assessment; like the sheet version, this clears any calculated final result."""
+        try:
+            max_marks = int(max_marks)
+        except (ValueError, TypeError):
+            return False, "Maximum Marks must be a number."
+        subject_id = self._subject_id(subject)
+        try:
+            with self.conn:
+                self.conn.execute("INSERT INTO assessments (subject_id, name, max_marks, position) "
+                                  "VALUES (?, ?, ?, (SELECT COUNT(*) FROM assessments WHERE subject_id = ?))",
+                                  (subject_id, name.strip().upper(), max_marks, subject_id))
+                self.conn.execute("UPDATE students SET final_result = NULL WHERE subject_id = ?", (subject_id,))
+        except sqlite3.IntegrityError:
+            return False, f"An assessment named '{name}' already exists."
+        return True, f"Assessment '{name}' added successfully."
+
+    def _assessment_id(self, subject_id, assessment_name):
+        row = self.conn.execute("SELECT id FROM assessments WHERE subject_id = ? AND name = ?", (subject_id, assessment_name.upper())).fetchone()
+        return row[0] if row else None
+
+    def get_marks_for_assessment(self, subject, assessment_name):
+        """Gets the marks of an assessment in roll number order, '' where there is no mark."""
+        subject_id = self._subject_id(subject)
+        assessment_id = self._assessment_id(subject_id, assessment_name)
+        if assessment_id is None: return []
+        rows = self.conn.execute("SELECT m.mark FROM students st LEFT JOIN marks m ON m.student_id = st.id AND m.assessment_id = ? "
+                                 "WHERE st.subject_id = ? ORDER BY st.serial", (assessment_id, subject_id))
+        return ['' if mark is None else format_mark(mark) for (mark,) in rows]
+
+    def save_marks(self, subject, assessment_name, marks_list):
+        """Saves a list of marks (in roll number order) to an assessment."""
+        subject_id = self._subject_id(subject)
+        assessment_id = self._assessment_id(subject_id, assessment_name)
+        if assessment_id is None: return False, "Could not find the assessment column."
+        try:
+            with self.conn:
+                students = self.conn.execute("SELECT id FROM students WHERE subject_id = ? ORDER BY serial", (subject_id,)).fetchall()
+                for (student_id,), mark in zip(students, marks_list):
+                    mark = number(mark)
+                    if mark is None:
+                        self.conn.execute("DELETE FROM marks WHERE assessment_id = ? AND student_id = ?", (assessment_id, student_id))
+                    else:
+                        self.conn.execute("INSERT OR REPLACE INTO marks (assessment_id, student_id, mark) VALUES (?, ?, ?)",
+                                          (assessment_id, student_id, mark))
+            return True, f"Marks for '{assessment_name}' saved successfully."
+        except Exception as e:
+            return False, f"An error occurred while saving: {e}"
+
+    def calculate_final_result(self, subject, weights_dict):
+        """Stores a weighted final score for every student; missing marks count as 0."""
+        subject_id = self._subject_id(subject)
+        terms = []
+        for name, weight in weights_dict.items():
+            assessment_id, max_marks = (self.conn.execute("SELECT id, max_marks FROM assessments WHERE subject_id = ? AND name = ?",
+                                                          (subject_id, name.upper())).fetchone() or (None, None))
+            if assessment_id is None or not max_marks: return False, f"Could not find data for '{name}'."
+            terms.append((assessment_id, weight / max_marks))
+        scores = {student_id: 0.0 for (student_id,) in self.conn.execute("SELECT id FROM students WHERE subject_id = ?", (subject_id,))}
+        for assessment_id, factor in terms:
+            for student_id, mark in self.conn.execute("SELECT student_id, mark FROM marks WHERE assessment_id = ?", (assessment_id,)):
+                scores[student_id] += mark * factor
+        with self.conn:
+            self.conn.executemany("UPDATE students SET final_result = ? WHERE id = ?",
+                                  [(f"{score:.2f}", student_id) for student_id, score in scores.items()])
+        return True, "Final result calculated successfully."
+
+    # --- Import and export ---
+    def import_workbook(self, xlsx_path):
+        """One-shot copy of an existing attendance workbook into this (empty) store."""
+        engine = _headless_engine(os.path.dirname(xlsx_path))
+        engine.load(os.path.basename(xlsx_path))
+        with self.conn:
+            for position, sheet in enumerate(engine.wb.worksheets):
+                schema, matrix = engine.schema_for(sheet), engine.matrix_for(sheet)
+                subject_id = self.conn.execute("INSERT INTO subjects (name, position) VALUES (?, ?)", (sheet.title, position)).lastrowid
+                student_ids = []
+                for i in range(matrix.num_students):
+                    serial = matrix.serials[i] if isinstance(matrix.serials[i], int) else i + 1
+                    final = matrix.final_results[i] if matrix.final_results is not None else None
+                    student_ids.append(self.conn.execute(
+                        "INSERT INTO students (subject_id, serial, name, roll, final_result) VALUES (?, ?, ?, ?, ?)",
+                        (subject_id, serial, matrix.names[i], matrix.rolls[i], None if final is None else str(final))).lastrowid)
+                for index, (date_str, hours, statuses) in enumerate(zip(matrix.dates, matrix.hours, matrix.statuses)):
+                    session_id = self.conn.execute("INSERT INTO sessions (subject_id, date, hours, position) VALUES (?, ?, ?, ?)",
+                                                   (subject_id, str(date_str or ''), hours, index)).lastrowid
+                    self.conn.executemany("INSERT INTO attendance (session_id, student_id, status) VALUES (?, ?, ?)",
+                                          [(session_id, student_id, status) for student_id, status in zip(student_ids, statuses) if status])
+                for index, name in enumerate(schema.assessment_cols()):
+                    assessment_id = self.conn.execute("INSERT INTO assessments (subject_id, name, max_marks, position) VALUES (?, ?, ?, ?)",
+                                                      (subject_id, name, engine.get_max_marks(sheet, name) or 0, index)).lastrowid
+                    self.conn.executemany("INSERT INTO marks (assessment_id, student_id, mark) VALUES (?, ?, ?)",
+                                          [(assessment_id, student_id, mark) for student_id, mark in zip(student_ids, matrix.mark_values(name)) if mark is not None])
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported_from', ?)", (os.path.abspath(xlsx_path),))
+
+    def export_xlsx(self, xlsx_path):
+        """Writes the familiar formatted workbook (same layout the app creates) from the stored data.
+        Nothing is written if any step fails; the (success, message) of the first failure is returned."""
+        engine = _headless_engine(os.path.dirname(os.path.abspath(xlsx_path)))
+        engine.current_filename = os.path.basename(xlsx_path)
+        for subject in self.get_subjects():
+            subject_id = self._subject_id(subject)
+            blanks = False
+            success, message = engine.add_subject(subject)
+            if not success: return False, f"Could not export '{subject}': {message}"
+            sheet = engine.wb[subject]
+            names, rolls = self.get_roster(subject)
+            success, message = engine.update_students(sheet, names, rolls)
+            if not success: return False, f"Could not export the students of '{subject}': {message}"
+            # Sessions are replayed in their original order so the columns line up the same way
+            for session_id, date_str, hours in self.conn.execute(
+                    "SELECT id, date, hours FROM sessions WHERE subject_id = ? ORDER BY position", (subject_id,)).fetchall():
+                statuses = self.conn.execute(
+                    "SELECT st.serial, a.status FROM students st LEFT JOIN attendance a ON a.student_id = st.id AND a.session_id = ? "
+                    "WHERE st.subject_id = ? ORDER BY st.serial", (session_id, subject_id)).fetchall()
+                col = engine.schema_for(sheet).next_session_col()
+                success, message = engine.mark_attendance(sheet, len(names), [serial for serial, status in statuses if status == ABSENT], hours, date_str)
+                if not success: return False, f"Could not export the session of {date_str} in '{subject}': {message}"
+                # Students with no mark for the session were written as present; blank them again
+                for index, (serial, status) in enumerate(statuses):
+                    if status not in (PRESENT, ABSENT):
+                        blanks = True
+                        cell = sheet.cell(row=index + 5, column=col)
+                        cell.value, cell.style = None, styles.CELL
+            if blanks:
+                engine.recalculate_summary(sheet) # The running totals counted the blanks as present
+            for (name,) in self.conn.execute("SELECT name FROM assessments WHERE subject_id = ? ORDER BY position", (subject_id,)).fetchall():
+                success, message = engine.add_new_assessment_column(sheet, name, self.get_max_marks(subject, name))
+                if success:
+                    success, message = engine.save_marks(sheet, name, [number(mark) for mark in self.get_marks_for_assessment(subject, name)])
+                if not success: return False, f"Could not export '{name}' in '{subject}': {message}"
+            results = [value for (value,) in self.conn.execute("SELECT final_result FROM students WHERE subject_id = ? ORDER BY serial", (subject_id,))]
+            if any(value is not None for value in results):
+                schema = engine.schema_for(sheet)
+                final_col = schema.true_last_column() + 1
+                schema.write(4, final_col, "FINAL RESULT")
+                sheet.cell(row=4, column=final_col).style = styles.HEADER
+                for i, value in enumerate(results):
+                    sheet.cell(row=i + 5, column=final_col).value = value
+                engine.apply_standard_styles(sheet, len(names))
+        if engine.wb is None: return False, "There are no subjects to export."
+        engine.request_save()
+        return engine.flush()
+
+
+def _headless_engine(data_path):
+    """An engine for one-shot imports and exports: no debounced saves and no journal, so the only
+    write is the explicit flush at the end."""
+    from attendance_engine import AttendanceEngine
+    return AttendanceEngine(data_path=data_path, schedule=lambda delay_ms, callback: None, cancel=lambda token: None,
+                            journaling=False)
+
+
+def _remove_database(db_path):
+    """Deletes a database file and the WAL files SQLite keeps next to it."""
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+def import_folder(data_path=USER_DATA_PATH):
+    """Imports every workbook in the data folder that does not have a database yet."""
+    imported = []
+    for filename in sorted(os.listdir(data_path)):
+        if not filename.endswith('.xlsx') or filename.startswith('~$'): continue
+        xlsx_path = os.path.join(data_path, filename)
+        db_path = db_path_for(xlsx_path)
+        if os.path.exists(db_path): continue
+        # Built under a temporary name, so a failed import leaves no database that would make later runs skip it
+        tmp_path = db_path + '.tmp'
+        _remove_database(tmp_path)
+        store = SqliteStore(tmp_path)
+        try:
+            store.import_workbook(xlsx_path)
+        except BaseException:
+            store.close()
+            _remove_database(tmp_path)
+            raise
+        store.close()
+        os.replace(tmp_path, db_path)
+        imported.append(filename)
+    return imported
+
+
+if __name__ == "__main__":
+    # python sqlite_store.py import [folder]   |   python sqlite_store.py export <file.db> <file.xlsx>
+    if len(sys.argv) >= 2 and sys.argv[1] == "import":
+        for filename in import_folder(sys.argv[2] if len(sys.argv) > 2 else USER_DATA_PATH):
+            print(f"Imported {filename}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "export":
+        store = SqliteStore(sys.argv[2])
+        print(store.export_xlsx(sys.argv[3])[1])
+        store.close()
+    else:
+        print("Usage: sqlite_store.py import [folder] | export <file.db> <file.xlsx>")
@@ -0,0 +1,55 @@
+def normalize(value):
+    """Lookup key for a student name or roll number: case and repeated spaces do not matter."""
+    return ' '.join(str(value).split()).upper()
+
+
+class StudentIndex:
+    """Workbook-wide lookup of students: normalized name and complex roll number -> {subject: row index},
+    plus each subject's assessments with their maximum marks. Subjects are (re)indexed one at a time,
+    so a roster or assessment change only costs that subject."""
+    def __init__(self):
+        self.by_name, self.by_roll = {}, {}
+        self.assessments = {} # subject -> [(assessment, max marks text)], sorted by name
+        self._rosters = {}    # subject -> (names, rolls) as indexed, so they can be taken out again
+        self._names = {}      # display name -> number of subject rows holding it
+
+    def set_roster(self, subject, names, rolls):
+        """Indexes (or re-indexes) a subject's student rows."""
+        self.remove_subject(subject, keep_assessments=True)
+        for index, (name, roll) in enumerate(zip(names, rolls)):
+            # A name listed twice maps to its last row, like SubjectMatrix.index_of_name
+            if name:
+                self.by_name.setdefault(normalize(name), {})[subject] = index
+                self._names[name] = self._names.get(name, 0) + 1
+            if roll:
+                self.by_roll.setdefault(normalize(roll), {})[subject] = index
+        self._rosters[subject] = (list(names), list(rolls))
+
+    def set_assessments(self, subject, schema):
+        """Re-reads a subject's assessment headers and their 'Out of' values from its schema."""
+        self.assessments[subject] = sorted((header, str(schema.value(3, col) or '').replace('Out of: ', ''))
+                                           for header, col in schema.assessment_cols().items())
+
+    def remove_subject(self, subject, keep_assessments=False):
+        names, rolls = self._rosters.pop(subject, ((), ()))
+        for name in names:
+            if not name: continue
+            self.by_name.get(normalize(name), {}).pop(subject, None)
+            self._names[name] -= 1
+            if not self._names[name]: del self._names[name]
+        for roll in rolls:
+            if roll: self.by_roll.get(normalize(roll), {}).pop(subject, None)
+        if not keep_assessments:
+            self.assessments.pop(subject, None)
+
+    def locate(self, name):
+        """{subject: row index} of every subject listing a student name."""
+        return self.by_name.get(normalize(name), {})
+
+    def locate_roll(self, roll):
+        """{subject: row index} of every subject listing a complex roll number."""
+        return self.by_roll.get(normalize(roll), {})
+
+    def all_names(self):
+        """Every distinct student name in the workbook, sorted."""
+        return sorted(self._names)
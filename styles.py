@@ -0,0 +1,64 @@
+# openpyxl is only imported once a workbook is styled, which keeps it out of the app's startup.
+
+# --- Shared named styles ---
+# Registered once per workbook; a cell then only stores a reference to one of them.
+CELL, NAME, HEADER, TITLE, LABEL, PRESENT, ABSENT = (
+    "Attender Cell", "Attender Name", "Attender Header", "Attender Title",
+    "Attender Label", "Attender Present", "Attender Absent")
+
+
+def _named_styles():
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+    center_align = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    left_align = Alignment(horizontal='left', vertical='center', wrap_text=True)
+    thin_side = Side(border_style="thin", color="000000")
+    full_border = Border(left=thin_side, right=thin_side, top=thin_side, bottom=thin_side)
+    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+    return [
+        NamedStyle(name=CELL, border=full_border, alignment=center_align),
+        NamedStyle(name=NAME, border=full_border, alignment=left_align),
+        NamedStyle(name=HEADER, font=Font(bold=True, name='Calibri', color="FFFFFF"), fill=header_fill, border=full_border, alignment=center_align),
+        NamedStyle(name=TITLE, font=Font(size=18, bold=True, name='Calibri'), border=full_border, alignment=center_align),
+        NamedStyle(name=LABEL, font=Font(bold=True), border=full_border, alignment=center_align),
+        NamedStyle(name=PRESENT, fill=PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"), border=full_border, alignment=center_align),
+        NamedStyle(name=ABSENT, fill=PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"), border=full_border, alignment=center_align),
+    ]
+
+
+def register_styles(wb):
+    """Adds the app's named styles to a workbook that does not have them yet."""
+    existing = set(wb.named_styles)
+    for style in _named_styles():
+        if style.name not in existing:
+            wb.add_named_style(style)
+
+
+def style_for(row, col, value):
+    """Which named style a cell of the standard layout gets."""
+    if row == 1:
+        return TITLE if col == 4 and value is not None else CELL
+    if row in (2, 3):
+        return LABEL if col == 2 else CELL
+    if row == 4:
+        return HEADER if value is not None else CELL
+    if col == 2:
+        return NAME
+    return PRESENT if value == 'P' else ABSENT if value == 'A' else CELL
+
+
+def style_block(sheet, min_row, max_row, min_col, max_col):
+    """Styles just the given block of cells, e.g. the ones a change wrote or created."""
+    if max_row < min_row or max_col < min_col: return
+    register_styles(sheet.parent)
+    for row in sheet.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+        for cell in row:
+            cell.style = style_for(cell.row, cell.column, cell.value)
+
+
+def set_column_widths(sheet, last_col):
+    """Fixed widths for the student columns; every other column up to last_col is 15 wide."""
+    from openpyxl.utils import get_column_letter
+    sheet.column_dimensions['A'].width = 10
+    sheet.column_dimensions['B'].width = 35
+    for col_idx in range(3, max(last_col, 26) + 1):
+        sheet.column_dimensions[get_column_letter(col_idx)].width = 15
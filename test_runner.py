@@ -114,10 +114,13 @@ def run_advanced_test():
             
             # Bypass GUI and call the backend function directly
             sheet = app.wb[subject]
-            app.mark_attendance(sheet, NUM_STUDENTS, absent_rolls, session_hours, session_date)
+            app.engine.mark_attendance(sheet, NUM_STUDENTS, absent_rolls, session_hours, session_date)
             app.update()
             time.sleep(0.3)
 
+    # Marks only schedule a save, so write the workbook before closing
+    app.engine.flush()
+
     print("\n--- Advanced Test Finished Successfully! ---")
     app.show_status("Automated test finished!", is_error=False)
     time.sleep(5)
@@ -1,20 +1,17 @@
 import customtkinter as ctk
 from tkinter import messagebox
-import openpyxl as xl
 import os
 from datetime import date, datetime
-from config import ICON_PATH, resource_path, USER_DATA_PATH
-from excel_helpers import count_student_rows
-import threading
-import requests
-import time
+from config import ICON_PATH, resource_path, USER_DATA_PATH, LIVE_RETRY_ATTEMPTS
+import diagnostics
+from widgets import VirtualChecklist, VirtualEntryGrid
 
 class LowAttendanceWindow(ctk.CTkToplevel):
     """Interactive window to generate low attendance reports."""
     def __init__(self, master, subject_name, sheet):
         super().__init__(master)
         self.title("Low Attendance Report")
-        self.geometry("450x500")
+        self.geometry("450x580")
         self.transient(master)
         self.focus()
         try:
@@ -22,6 +19,7 @@ class LowAttendanceWindow(ctk.CTkToplevel):
         except: pass
 
         self.app = master
+        self.engine = master.engine
         self.sheet = sheet
         self.subject_name = subject_name
         self.grid_columnconfigure(0, weight=1)
@@ -37,6 +35,13 @@ class LowAttendanceWindow(ctk.CTkToplevel):
         ctk.CTkLabel(controls_frame, text="%").grid(row=0, column=2, padx=(2, 10), pady=10)
         self.report_button = ctk.CTkButton(controls_frame, text="Generate Report", command=self.generate_report)
         self.report_button.grid(row=0, column=3, padx=10, pady=10)
+        # Dragging the slider re-runs the (cached, bisected) query as it moves
+        self.percent_slider = ctk.CTkSlider(controls_frame, from_=0, to=100, number_of_steps=100, command=self.on_slider_move)
+        self.percent_slider.grid(row=1, column=0, columnspan=4, padx=10, pady=(0, 10), sticky="ew")
+        self.percent_slider.set(75)
+        self.all_subjects_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(controls_frame, text="All subjects in this file", variable=self.all_subjects_var, command=self.generate_report).grid(row=2, column=0, columnspan=4, padx=10, pady=(0, 10), sticky="w")
+        self._slider_pending = False
         
         self.error_label = ctk.CTkLabel(self, text="", text_color=("#C00000", "#FF8282"))
         self.error_label.grid(row=1, column=0, padx=20, pady=(0, 10), sticky="w")
@@ -47,6 +52,19 @@ class LowAttendanceWindow(ctk.CTkToplevel):
         self.textbox.configure(state="disabled")
         self.generate_report()
 
+    def on_slider_move(self, value):
+        self.percent_entry.delete(0, "end")
+        self.percent_entry.insert(0, str(int(value)))
+        # Coalesce a fast drag into one report per idle moment
+        if not self._slider_pending:
+            self._slider_pending = True
+            self.after_idle(self._apply_slider)
+
+    def _apply_slider(self):
+        self._slider_pending = False
+        self.generate_report()
+
+    @diagnostics.timed("ui.LowAttendanceWindow.generate_report")
     def generate_report(self):
         self.error_label.configure(text="")
         try:
@@ -57,22 +75,34 @@ class LowAttendanceWindow(ctk.CTkToplevel):
         except (ValueError, TypeError):
             self.error_label.configure(text="Error: Please enter a valid number.")
             return
+        self.percent_slider.set(threshold)
 
-        student_list = self.app.get_low_attendance_students(self.sheet, threshold)
+        if self.all_subjects_var.get():
+            report_text = self._workbook_report(threshold)
+        else:
+            report_text = self._subject_report(self.subject_name, self.engine.get_low_attendance_students(self.sheet, threshold), threshold)
         self.textbox.configure(state="normal")
         self.textbox.delete("1.0", "end")
-        
-        if student_list is None:
-            report_text = f"Could not find a 'PERCENTAGE' column in {self.subject_name}."
-        elif not student_list:
-            report_text = f"Congratulations!\n\nNo students in {self.subject_name} below {threshold}%."
-        else:
-            header = f"Students in {self.subject_name} below {threshold}% attendance:\n{'-'*50}\n"
-            report_text = header + "\n".join(student_list)
-        
         self.textbox.insert("1.0", report_text)
         self.textbox.configure(state="disabled")
 
+    def _subject_report(self, subject_name, student_list, threshold):
+        if student_list is None:
+            return f"Could not find a 'PERCENTAGE' column in {subject_name}."
+        elif not student_list:
+            return f"Congratulations!\n\nNo students in {subject_name} below {threshold}%."
+        header = f"Students in {subject_name} below {threshold}% attendance:\n{'-'*50}\n"
+        return header + "\n".join(student_list)
+
+    def _workbook_report(self, threshold):
+        subjects = self.engine.get_low_attendance_across_workbook(threshold)
+        if not subjects:
+            return "No subject in this file has a 'PERCENTAGE' column."
+        low = [(subject_name, students) for subject_name, students in subjects if students]
+        if not low:
+            return f"Congratulations!\n\nNo students in any subject below {threshold}%."
+        return "\n\n".join(self._subject_report(subject_name, students, threshold) for subject_name, students in low)
+
 class ManageWindow(ctk.CTkToplevel):
     """Window for creating subjects and managing student lists with separate name/roll number fields."""
     def __init__(self, master):
@@ -86,7 +116,7 @@ class ManageWindow(ctk.CTkToplevel):
         except: pass
 
         self.app = master
-        self.current_filename = self.app.current_filename 
+        self.engine = master.engine
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(2, weight=1) # Configure main content row to expand
         
@@ -121,6 +151,8 @@ class ManageWindow(ctk.CTkToplevel):
         ctk.CTkLabel(controls_frame, text="Update Student List", font=ctk.CTkFont(weight="bold")).pack(side="left")
         generator_button = ctk.CTkButton(controls_frame, text="Generate Roll Numbers...", width=160, command=self.open_generator_dialog)
         generator_button.pack(side="right")
+        restyle_button = ctk.CTkButton(controls_frame, text="Fix Formatting", width=110, command=self.restyle_subject)
+        restyle_button.pack(side="right", padx=(0, 5))
         
         ctk.CTkLabel(student_frame, text="Max Students in Class:").grid(row=1, column=0, padx=10, pady=(10,0), sticky="w")
         self.max_students_entry = ctk.CTkEntry(student_frame, placeholder_text="e.g., 65")
@@ -165,12 +197,9 @@ class ManageWindow(ctk.CTkToplevel):
             return
             
         try:
-            source_sheet = self.app.wb[source_subject]
-            num_students = count_student_rows(source_sheet)
-            
             # Read names and rolls from the source sheet
-            names = [str(source_sheet.cell(row=row, column=2).value or '') for row in range(5, num_students + 5)]
-            rolls = [str(source_sheet.cell(row=row, column=3).value or '') for row in range(5, num_students + 5)]
+            names, rolls = self.engine.get_roster(self.engine.wb[source_subject])
+            num_students = len(names)
             
             # Populate the textboxes
             self.names_textbox.delete("1.0", "end")
@@ -188,8 +217,8 @@ class ManageWindow(ctk.CTkToplevel):
 
     def refresh_subject_list(self):
         """Reloads the list of subjects from the workbook into BOTH dropdowns."""
-        if self.app.wb:
-            subjects = self.app.wb.sheetnames
+        if self.engine.wb:
+            subjects = self.engine.wb.sheetnames
             # Configure both dropdowns with the same list of subjects
             self.subject_select_combo.configure(values=subjects)
             self.copy_source_combo.configure(values=subjects)
@@ -210,19 +239,17 @@ class ManageWindow(ctk.CTkToplevel):
         # Clear both textboxes
         self.names_textbox.delete("1.0", "end")
         self.rolls_textbox.delete("1.0", "end")
-        if not self.app.wb: return
+        if not self.engine.wb: return
         
         try:
-            sheet = self.app.wb[selected_subject]
             # Get data from Column B (Names) and C (Roll Numbers)
-            names = [str(sheet.cell(row=row, column=2).value or '') for row in range(5, count_student_rows(sheet) + 5)]
-            rolls = [str(sheet.cell(row=row, column=3).value or '') for row in range(5, count_student_rows(sheet) + 5)]
+            names, rolls = self.engine.get_roster(self.engine.wb[selected_subject])
             
             # Insert data into the correct textboxes
             self.names_textbox.insert("1.0", "\n".join(names))
             self.rolls_textbox.insert("1.0", "\n".join(rolls))
         except Exception as e:
-            print(f"Error loading student data: {e}")
+            messagebox.showerror("Error", f"Could not load the students of '{selected_subject}': {e}", parent=self)
 
     # This function is new
     def populate_from_generator(self, rolls_list):
@@ -236,6 +263,7 @@ class ManageWindow(ctk.CTkToplevel):
         RollGeneratorDialog(self)
 
     # This function is updated
+    @diagnostics.timed("ui.ManageWindow.update_students")
     def update_students(self):
         """Saves student data from the two separate textboxes."""
         selected_subject = self.subject_select_combo.get()
@@ -253,37 +281,32 @@ class ManageWindow(ctk.CTkToplevel):
         if not messagebox.askyesno("Confirm", f"Overwrite student list for '{selected_subject}' with {len(student_names)} students?", parent=self): return
         
         try:
-            sheet = self.app.wb[selected_subject]
-            # Clear old student data from columns A, B, and C
-            for row in range(5, sheet.max_row + 5):
-                for col in range(1, 4): sheet.cell(row=row, column=col).value = None
-            
-            # Write new student data from the two textboxes
-            for i in range(len(student_names)):
-                sheet.cell(row=i+5, column=1).value = i + 1              # Simple Roll No.
-                sheet.cell(row=i+5, column=2).value = student_names[i]   # Name
-                sheet.cell(row=i+5, column=3).value = student_rolls[i]   # Complex Roll No.
-            
-            self.app.apply_standard_styles(sheet, len(student_names))
-            self.app.wb.save(os.path.join(USER_DATA_PATH, self.current_filename))
-            messagebox.showinfo("Success", f"Student list for '{selected_subject}' updated.", parent=self)
+            success, message = self.engine.update_students(self.engine.wb[selected_subject], student_names, student_rolls)
+            messagebox.showinfo("Success", message, parent=self)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update students: {e}", parent=self)
             
+    @diagnostics.timed("ui.ManageWindow.restyle_subject")
+    def restyle_subject(self):
+        """Re-applies the standard borders, colours and widths to every cell of the selected subject."""
+        selected_subject = self.subject_select_combo.get()
+        if not selected_subject or "No subjects" in selected_subject: return messagebox.showerror("Error", "Please select a valid subject.", parent=self)
+        try:
+            success, message = self.engine.restyle_sheet(self.engine.wb[selected_subject])
+            messagebox.showinfo("Success", message, parent=self)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to fix formatting: {e}", parent=self)
+
     # The other functions (add_subject, etc.) remain the same
+    @diagnostics.timed("ui.ManageWindow.add_subject")
     def add_subject(self):
         new_name = self.new_subject_entry.get().strip()
         if not new_name: return messagebox.showerror("Error", "Subject name cannot be empty.", parent=self)
-        if self.app.wb is None:
-            self.app.wb = xl.Workbook()
-            self.app.wb.remove(self.app.wb.active)
-        if new_name in self.app.wb.sheetnames: return messagebox.showerror("Error", f"A subject named '{new_name}' already exists.", parent=self)
         
-        new_sheet = self.app.wb.create_sheet(title=new_name)
-        self.app.format_new_sheet(new_sheet)
         try:
-            self.app.wb.save(os.path.join(USER_DATA_PATH, self.current_filename))
-            messagebox.showinfo("Success", f"Subject '{new_name}' was created.", parent=self)
+            success, message = self.engine.add_subject(new_name)
+            if not success: return messagebox.showerror("Error", message, parent=self)
+            messagebox.showinfo("Success", message, parent=self)
             self.new_subject_entry.delete(0, "end")
             self.refresh_subject_list()
             self.app.update_main_subject_list()
@@ -303,21 +326,24 @@ class DetailedReportWindow(ctk.CTkToplevel):
         except: pass
 
         self.app = master
+        self.engine = master.engine
         self.sheet = sheet
 
         # --- Create a Tab View to switch between report types ---
-        self.tab_view = ctk.CTkTabview(self, width=480)
+        # Each tab is only built the first time it is shown
+        self.tab_view = ctk.CTkTabview(self, width=480, command=self.on_tab_selected)
         self.tab_view.pack(padx=20, pady=40, fill="both", expand=True)
-        self.tab_view.add("By Date")
-        self.tab_view.add("By Name")
-        self.tab_view.add("Student Summary")
-        
-        # --- Populate the "By Date" Tab ---
-        self.setup_date_tab()
-        
-        # --- Populate the "By Name" Tab ---
-        self.setup_name_tab()
-        self.setup_student_summary_tab()
+        self.tab_builders = {"By Date": self.setup_date_tab, "By Name": self.setup_name_tab, "Student Summary": self.setup_student_summary_tab}
+        for tab_name in self.tab_builders:
+            self.tab_view.add(tab_name)
+        self.built_tabs = set()
+        self.on_tab_selected()
+
+    def on_tab_selected(self):
+        tab_name = self.tab_view.get()
+        if tab_name not in self.built_tabs:
+            self.built_tabs.add(tab_name)
+            self.tab_builders[tab_name]()
 
     def setup_date_tab(self):
         """Creates the widgets for the 'By Date' report tab with a collapsible list."""
@@ -332,17 +358,9 @@ class DetailedReportWindow(ctk.CTkToplevel):
         self.date_toggle_button.pack(side="right", anchor="e", padx=10, pady=5)
         
         # This frame can now be hidden/shown
-        self.date_checklist_frame = ctk.CTkScrollableFrame(date_tab, label_text="Select Dates")
+        self.date_checklist_frame = VirtualChecklist(date_tab, self.engine.get_all_dates_from_sheet(self.sheet), label_text="Select Dates")
         self.date_checklist_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
-        self.date_checkboxes = {}
-        all_dates = self.app.get_all_dates_from_sheet(self.sheet)
-        for date_str in all_dates:
-            var = ctk.StringVar(value="off")
-            cb = ctk.CTkCheckBox(self.date_checklist_frame, text=date_str, variable=var, onvalue="on", offvalue="off")
-            cb.pack(anchor="w", padx=10, pady=2)
-            self.date_checkboxes[date_str] = var
-
         generate_btn = ctk.CTkButton(date_tab, text="Generate Date Report", command=self.generate_date_report)
         generate_btn.pack(padx=10, pady=10, fill="x")
         
@@ -384,18 +402,10 @@ class DetailedReportWindow(ctk.CTkToplevel):
         self.toggle_button = ctk.CTkButton(top_frame, text="Hide Student List", width=140, command=self.toggle_student_list)
         self.toggle_button.pack(side="right", anchor="e", padx=10, pady=5)
         
-        # Create a scrollable frame for the student checklist
-        self.checklist_frame = ctk.CTkScrollableFrame(name_tab, label_text="Student List")
+        # Only the visible rows of the checklist are real widgets
+        self.checklist_frame = VirtualChecklist(name_tab, list(dict.fromkeys(self.engine.get_student_list(self.sheet))), label_text="Student List")
         self.checklist_frame.pack(padx=10, pady=5, fill="both", expand=True)
 
-        self.student_checkboxes = {}
-        student_names = self.app.get_student_list(self.sheet)
-        for name in student_names:
-            var = ctk.StringVar(value="off")
-            cb = ctk.CTkCheckBox(self.checklist_frame, text=name, variable=var, onvalue="on", offvalue="off")
-            cb.pack(anchor="w", padx=10, pady=2)
-            self.student_checkboxes[name] = var
-
         generate_btn = ctk.CTkButton(name_tab, text="Generate Name Report", command=self.generate_name_report)
         generate_btn.pack(padx=10, pady=10, fill="x")
         
@@ -404,11 +414,12 @@ class DetailedReportWindow(ctk.CTkToplevel):
         self.name_results_textbox.insert("1.0", "Select students and click 'Generate Report'.")
         self.name_results_textbox.configure(state="disabled")
 
+    @diagnostics.timed("ui.DetailedReportWindow.generate_date_report")
     def generate_date_report(self):
         """Gathers selected dates and generates the report."""
-        selected_dates = [date_str for date_str, var in self.date_checkboxes.items() if var.get() == "on"]
+        selected_dates = self.date_checklist_frame.selected()
         
-        report_lines = self.app.get_report_by_date(self.sheet, selected_dates)
+        report_lines = self.engine.get_report_by_date(self.sheet, selected_dates)
         report_text = "\n\n".join(report_lines)
             
         self.date_results_textbox.configure(state="normal")
@@ -416,13 +427,14 @@ class DetailedReportWindow(ctk.CTkToplevel):
         self.date_results_textbox.insert("1.0", report_text)
         self.date_results_textbox.configure(state="disabled")
 
+    @diagnostics.timed("ui.DetailedReportWindow.generate_name_report")
     def generate_name_report(self):
-        selected_names = [name for name, var in self.student_checkboxes.items() if var.get() == "on"]
+        selected_names = self.checklist_frame.selected()
         
         if not selected_names:
             report_text = "Please select at least one student from the checklist."
         else:
-            report_lines = self.app.get_report_by_name(self.sheet, selected_names)
+            report_lines = self.engine.get_report_by_name(self.sheet, selected_names)
             report_text = "\n\n".join(report_lines)
             
         self.name_results_textbox.configure(state="normal")
@@ -441,17 +453,9 @@ class DetailedReportWindow(ctk.CTkToplevel):
         self.summary_toggle_button = ctk.CTkButton(top_frame, text="Hide Student List", width=140, command=self.toggle_student_summary_list)
         self.summary_toggle_button.pack(side="right", anchor="e", padx=10, pady=5)
 
-        self.summary_checklist_frame = ctk.CTkScrollableFrame(summary_tab, label_text="Master Student List")
+        self.summary_checklist_frame = VirtualChecklist(summary_tab, self.engine.get_all_students_in_workbook(), label_text="Master Student List")
         self.summary_checklist_frame.pack(padx=10, pady=5, fill="both", expand=True)
 
-        self.summary_checkboxes = {} # Use checkboxes for multi-select
-        all_students = self.app.get_all_students_in_workbook()
-        for name in all_students:
-            var = ctk.StringVar(value="off")
-            cb = ctk.CTkCheckBox(self.summary_checklist_frame, text=name, variable=var, onvalue="on", offvalue="off")
-            cb.pack(anchor="w", padx=10, pady=2)
-            self.summary_checkboxes[name] = var
-
         generate_btn = ctk.CTkButton(summary_tab, text="Generate Student Summary", command=self.generate_student_summary_report)
         generate_btn.pack(padx=10, pady=10, fill="x")
         
@@ -460,11 +464,12 @@ class DetailedReportWindow(ctk.CTkToplevel):
         self.summary_results_textbox.insert("1.0", "Select one or more students and click 'Generate'.")
         self.summary_results_textbox.configure(state="disabled")
 
+    @diagnostics.timed("ui.DetailedReportWindow.generate_student_summary_report")
     def generate_student_summary_report(self):
         """Gathers data for multiple students across all sheets."""
-        selected_students = [name for name, var in self.summary_checkboxes.items() if var.get() == "on"]
+        selected_students = self.summary_checklist_frame.selected()
         
-        report_text = self.app.get_summary_for_student_across_all_sheets(selected_students)
+        report_text = self.engine.get_summary_for_student_across_all_sheets(selected_students)
             
         self.summary_results_textbox.configure(state="normal")
         self.summary_results_textbox.delete("1.0", "end")
@@ -555,12 +560,13 @@ class BulkEntryWindow(ctk.CTkToplevel):
         except: pass
 
         self.app = master
+        self.engine = master.engine
         self.sheet = sheet
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(2, weight=1)
         
         ctk.CTkLabel(self, text="Paste or type attendance data below.", font=ctk.CTkFont(weight="bold")).grid(row=0, column=0, padx=20, pady=(20, 5), sticky="w")
-        ctk.CTkLabel(self, text="Format: DATE:HOURS:ABSENTEE_ROLLS (e.g., 08-08-2025:2:1,3,5)", text_color="gray").grid(row=1, column=0, padx=20, pady=(0, 10), sticky="w")
+        ctk.CTkLabel(self, text="Format: DATE:HOURS:ABSENTEE_ROLLS (e.g., 08-08-2025:2:1,3,5-9 or 22CS001)", text_color="gray").grid(row=1, column=0, padx=20, pady=(0, 10), sticky="w")
         
         self.input_textbox = ctk.CTkTextbox(self, font=("", 14), height=150)
         self.input_textbox.grid(row=2, column=0, padx=20, pady=5, sticky="nsew")
@@ -571,14 +577,6 @@ class BulkEntryWindow(ctk.CTkToplevel):
         self.results_textbox = ctk.CTkTextbox(self, corner_radius=8, font=("", 12), state="disabled")
         self.results_textbox.grid(row=4, column=0, padx=20, pady=(5, 20), sticky="nsew")
 
-    def log_message(self, message):
-        """Adds a message to the results log textbox."""
-        self.results_textbox.configure(state="normal")
-        self.results_textbox.insert("end", message + "\n")
-        self.results_textbox.configure(state="disabled")
-        self.results_textbox.see("end")
-        self.update_idletasks()
-
     def _parse_date(self, date_str):
         """Tries to parse a date string using multiple common formats."""
         # A list of date formats to try
@@ -599,68 +597,6 @@ class BulkEntryWindow(ctk.CTkToplevel):
         # If all formats fail, return None
         return None
 
-    def process_entries(self):
-        """Validates and processes each line from the input textbox."""
-        self.process_button.configure(state="disabled")
-        self.results_textbox.configure(state="normal")
-        self.results_textbox.delete("1.0", "end")
-        self.results_textbox.configure(state="disabled")
-
-        self.log_message("--- Starting bulk processing ---")
-        
-        all_lines = self.input_textbox.get("1.0", "end").strip().splitlines()
-        total_students = count_student_rows(self.sheet)
-
-        for i, line in enumerate(all_lines):
-            line = line.strip()
-            if not line: continue
-
-            self.log_message(f"\nProcessing line {i+1}: '{line}'")
-            try:
-                parts = line.split(':')
-                if len(parts) != 3:
-                    self.log_message("  -> ERROR: Invalid format. Must be DATE:HOURS:ROLLS.")
-                    continue
-                
-                date_input, hours_str, rolls_str = [p.strip() for p in parts]
-                
-                # --- NEW: Use the smart date parser ---
-                date_str = self._parse_date(date_input)
-                if date_str is None:
-                    self.log_message(f"  -> ERROR: Invalid date format for '{date_input}'.")
-                    continue
-                
-                num_hours = int(hours_str)
-                if not 1 <= num_hours <= 8:
-                    self.log_message("  -> ERROR: Hours must be between 1 and 8.")
-                    continue
-
-                parsed_rolls = [int(r.strip()) for r in rolls_str.split(',') if r.strip()] if rolls_str else []
-                invalid_rolls = [r for r in parsed_rolls if r > total_students or r < 1]
-                if invalid_rolls:
-                    self.log_message(f"  -> ERROR: Invalid Rolls: {invalid_rolls} out of range (1-{total_students}).")
-                    continue
-                
-                existing_date_col = None
-                for col in range(4, self.sheet.max_column + 2):
-                    if self.sheet.cell(row=2, column=col).value == date_str:
-                        existing_date_col = col
-                        break
-                
-                if existing_date_col:
-                    if not messagebox.askyesno("Confirm Overwrite", f"An entry for {date_str} already exists.\n\nDo you want to overwrite it?", parent=self):
-                        self.log_message(f"  -> SKIPPED: User chose not to overwrite date {date_str}.")
-                        continue
-
-                success, message = self.app.mark_attendance(self.sheet, total_students, parsed_rolls, num_hours, date_str, overwrite_col=existing_date_col)
-                self.log_message(f"  -> STATUS: {message}")
-
-            except Exception as e:
-                self.log_message(f"  -> FAILED: An unexpected error occurred. ({e})")
-        
-        self.log_message("\n--- Bulk processing complete! ---")
-        self.process_button.configure(state="normal")
-
     def log_message(self, message):
         """Adds a message to the results log textbox."""
         self.results_textbox.configure(state="normal")
@@ -669,8 +605,9 @@ class BulkEntryWindow(ctk.CTkToplevel):
         self.results_textbox.see("end") # Auto-scroll to the bottom
         self.update_idletasks() # Force UI to update
 
+    @diagnostics.timed("ui.BulkEntryWindow.process_entries")
     def process_entries(self):
-        """Validates and processes each line from the input textbox with detailed logging."""
+        """Validates every line first, then applies all sessions as one batch (all or nothing)."""
         self.process_button.configure(state="disabled")
         self.results_textbox.configure(state="normal")
         self.results_textbox.delete("1.0", "end")
@@ -679,18 +616,18 @@ class BulkEntryWindow(ctk.CTkToplevel):
         self.log_message("--- Starting bulk processing ---")
         
         all_lines = self.input_textbox.get("1.0", "end").strip().splitlines()
-        total_students = count_student_rows(self.sheet)
+        total_students = self.engine.count_students(self.sheet)
+        entries, seen_dates, errors = [], {}, 0
         
         for i, line in enumerate(all_lines):
             line = line.strip()
             if not line: continue
 
-            self.log_message(f"\nProcessing line {i+1}: '{line}'")
-
             # 1. Validate the overall format (must have 3 parts separated by ':')
             parts = line.split(':')
             if len(parts) != 3:
-                self.log_message("  -> ERROR: Invalid format. Expected DATE:HOURS:ROLLS.")
+                self.log_message(f"Line {i+1}: ERROR: Invalid format. Expected DATE:HOURS:ROLLS.")
+                errors += 1
                 continue
             
             date_input, hours_str, rolls_str = [p.strip() for p in parts]
@@ -698,50 +635,56 @@ class BulkEntryWindow(ctk.CTkToplevel):
             # 2. Validate the Date
             date_str = self._parse_date(date_input)
             if date_str is None:
-                self.log_message(f"  -> ERROR: Invalid date format '{date_input}'. Use DD-MM-YYYY or similar.")
+                self.log_message(f"Line {i+1}: ERROR: Invalid date format '{date_input}'. Use DD-MM-YYYY or similar.")
+                errors += 1
+                continue
+            if date_str in seen_dates:
+                self.log_message(f"Line {i+1}: ERROR: {date_str} is already entered on line {seen_dates[date_str]}.")
+                errors += 1
                 continue
 
             # 3. Validate the Hours
             try:
                 num_hours = int(hours_str)
                 if not 1 <= num_hours <= 8:
-                    self.log_message(f"  -> ERROR: Hours '{num_hours}' must be between 1 and 8.")
+                    self.log_message(f"Line {i+1}: ERROR: Hours '{num_hours}' must be between 1 and 8.")
+                    errors += 1
                     continue
             except (ValueError, TypeError):
-                self.log_message(f"  -> ERROR: Hours '{hours_str}' is not a valid number.")
+                self.log_message(f"Line {i+1}: ERROR: Hours '{hours_str}' is not a valid number.")
+                errors += 1
                 continue
 
-            # 4. Validate the Roll Numbers
-            try:
-                # Handle the "0" for all present case specifically
-                if rolls_str == "0":
-                    parsed_rolls = []
-                else:
-                    parsed_rolls = [int(r.strip()) for r in rolls_str.split(',') if r.strip()] if rolls_str else []
-                
-                invalid_rolls = [r for r in parsed_rolls if r > total_students or r < 1]
-                if invalid_rolls:
-                    self.log_message(f"  -> ERROR: Invalid Rolls {invalid_rolls} (out of range 1-{total_students}).")
-                    continue
-            except (ValueError, TypeError):
-                self.log_message(f"  -> ERROR: Roll numbers '{rolls_str}' contain non-numeric characters.")
+            # 4. Validate the Roll Numbers ("0" for all present); serials, complex rolls and ranges are accepted
+            parsed_rolls, invalid_rolls = self.engine.resolve_rolls(self.sheet, rolls_str) if rolls_str != "0" else ([], [])
+            if invalid_rolls:
+                self.log_message(f"Line {i+1}: ERROR: Invalid Rolls {', '.join(invalid_rolls)} (use 1-{total_students}, complex roll numbers or ranges like 5-9).")
+                errors += 1
                 continue
 
-            # 5. Check for existing date and ask to overwrite
-            existing_date_col = None
-            for col in range(4, self.sheet.max_column + 2):
-                if self.sheet.cell(row=2, column=col).value == date_str:
-                    existing_date_col = col
-                    break
-            
-            if existing_date_col:
-                if not messagebox.askyesno("Confirm Overwrite", f"An entry for {date_str} (from line {i+1}) already exists.\n\nDo you want to overwrite it?", parent=self):
-                    self.log_message(f"  -> SKIPPED: User chose not to overwrite date {date_str}.")
-                    continue
+            seen_dates[date_str] = i + 1
+            entries.append((date_str, num_hours, parsed_rolls))
+
+        if errors:
+            self.log_message(f"\n--- {errors} line(s) have errors. Nothing was saved; fix them and process again. ---")
+            self.process_button.configure(state="normal")
+            return
+        if not entries:
+            self.log_message("\n--- Nothing to process. ---")
+            self.process_button.configure(state="normal")
+            return
 
-            # If all validations pass, call the main mark_attendance function
-            success, message = self.app.mark_attendance(self.sheet, total_students, parsed_rolls, num_hours, date_str, overwrite_col=existing_date_col)
-            self.log_message(f"  -> STATUS: {message}")
+        # 5. One question for every date that already exists
+        existing_dates = [date_str for date_str, _, _ in entries if date_str in self.engine.schema_for(self.sheet).dates]
+        if existing_dates:
+            shown = ", ".join(existing_dates[:10]) + (" ..." if len(existing_dates) > 10 else "")
+            if not messagebox.askyesno("Confirm Overwrite", f"{len(existing_dates)} of these dates already exist ({shown}).\n\nDo you want to overwrite them?", parent=self):
+                entries = [entry for entry in entries if entry[0] not in existing_dates]
+                self.log_message(f"SKIPPED: {len(existing_dates)} existing date(s) were left unchanged.")
+
+        if entries:
+            success, message = self.engine.mark_attendance_batch(self.sheet, total_students, entries)
+            self.log_message(f"STATUS: {message}")
         
         self.log_message("\n--- Bulk processing complete! ---")
         self.process_button.configure(state="normal")
@@ -806,12 +749,12 @@ class MarkEntryWindow(ctk.CTkToplevel):
         except: pass
 
         self.app = master
+        self.engine = master.engine
         self.sheet = sheet
-        self.student_names = self.app.get_student_list(self.sheet)
-        self.entry_widgets = []
+        self.student_names = self.engine.get_student_list(self.sheet)
 
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(2, weight=1)
+        self.grid_rowconfigure(1, weight=1)
 
         # --- Top Controls ---
         top_frame = ctk.CTkFrame(self)
@@ -825,10 +768,9 @@ class MarkEntryWindow(ctk.CTkToplevel):
         add_assessment_btn.grid(row=0, column=2, padx=10, pady=10)
 
         # --- Main Data Entry Grid ---
-        self.grid_frame = ctk.CTkScrollableFrame(self, label_text="Student Marks")
-        self.grid_frame.grid(row=1, column=0, columnspan=2, padx=20, pady=5, sticky="nsew")
-        self.grid_frame.grid_columnconfigure(0, weight=3)
-        self.grid_frame.grid_columnconfigure(1, weight=1)
+        # Only the rows on screen are widgets; the marks themselves live in the grid's list
+        self.marks_grid = VirtualEntryGrid(self, self.student_names, label_text="Student Marks")
+        self.marks_grid.grid(row=1, column=0, columnspan=2, padx=20, pady=5, sticky="nsew")
         
         # --- Bulk Entry Section ---
         bulk_frame = ctk.CTkFrame(self)
@@ -854,20 +796,10 @@ class MarkEntryWindow(ctk.CTkToplevel):
         calc_btn = ctk.CTkButton(button_frame, text="Calculate Final Result", command=self.open_calculator)
         calc_btn.grid(row=0, column=2, padx=5, sticky="ew")
         
-        self.populate_grid()
         self.refresh_assessments()
 
-    def populate_grid(self):
-        """Creates the student name labels and mark entry boxes."""
-        for i, name in enumerate(self.student_names):
-            label = ctk.CTkLabel(self.grid_frame, text=f"{i+1}. {name}")
-            label.grid(row=i, column=0, padx=10, pady=5, sticky="w")
-            entry = ctk.CTkEntry(self.grid_frame)
-            entry.grid(row=i, column=1, padx=10, pady=5, sticky="ew")
-            self.entry_widgets.append(entry)
-            
     def refresh_assessments(self):
-        assessments = self.app.get_assessment_list(self.sheet)
+        assessments = self.engine.get_assessment_list(self.sheet)
         self.assessment_combo.configure(values=assessments)
         if assessments:
             self.assessment_combo.set(assessments[0])
@@ -875,13 +807,24 @@ class MarkEntryWindow(ctk.CTkToplevel):
         else:
             self.assessment_combo.set("No assessments created yet")
 
+    @diagnostics.timed("ui.MarkEntryWindow.load_marks_into_grid")
     def load_marks_into_grid(self, assessment_name):
-        """Loads existing marks from the sheet into the individual entry boxes."""
-        marks = self.app.get_marks_for_assessment(self.sheet, assessment_name)
-        for i, entry in enumerate(self.entry_widgets):
-            entry.delete(0, "end")
-            if i < len(marks):
-                entry.insert(0, marks[i])
+        """Loads existing marks from the sheet into the grid and checks edits against the assessment's max marks."""
+        max_mark = self.engine.get_max_marks(self.sheet, assessment_name)
+        self.marks_grid.validate = None if max_mark is None else (lambda text: self.check_mark(text, max_mark))
+        self.marks_grid.set_values(self.engine.get_marks_for_assessment(self.sheet, assessment_name))
+
+    @staticmethod
+    def check_mark(text, max_mark):
+        """Error message for a typed mark, or None if it is empty or a whole number from 0 to max_mark."""
+        if not text: return None
+        try:
+            mark_int = int(text)
+        except ValueError:
+            return f"'{text}' is not a valid number."
+        if not 0 <= mark_int <= max_mark:
+            return f"Mark '{mark_int}' is out of range (0 to {max_mark})."
+        return None
     
     def apply_bulk_marks(self):
         """Validates and then pastes marks from the bulk textbox into the grid."""
@@ -890,7 +833,7 @@ class MarkEntryWindow(ctk.CTkToplevel):
         if not assessment_name or "No assessments" in assessment_name:
             return messagebox.showerror("Error", "Please select an assessment first.", parent=self)
             
-        max_mark = self.app.get_max_marks(self.sheet, assessment_name)
+        max_mark = self.engine.get_max_marks(self.sheet, assessment_name)
         if max_mark is None:
             return messagebox.showerror("Error", f"Could not determine max marks for '{assessment_name}'.", parent=self)
 
@@ -912,11 +855,9 @@ class MarkEntryWindow(ctk.CTkToplevel):
                 messagebox.showerror("Validation Error", f"Error on line {i+1} of your bulk entry:\n\n'{mark_str}' is not a valid number.", parent=self)
                 return # Stop the entire process
 
-        # --- 4. If all validations pass, apply the marks to the grid ---
-        for i, entry in enumerate(self.entry_widgets):
-            entry.delete(0, "end")
-            if i < len(marks_list_str):
-                entry.insert(0, marks_list_str[i])
+        # --- 4. If all validations pass, apply the marks to the grid (as unsaved changes) ---
+        self.marks_grid.values = [mark_str.strip() for mark_str in marks_list_str]
+        self.marks_grid.revalidate()
         
         self.bulk_textbox.delete("1.0", "end")
         messagebox.showinfo("Success", "Bulk marks applied to the grid. Click 'Save All Marks' to make them permanent.", parent=self)
@@ -936,40 +877,36 @@ class MarkEntryWindow(ctk.CTkToplevel):
         result = dialog.result
         if result:
             name, max_marks = result
-            success, message = self.app.add_new_assessment_column(self.sheet, name, max_marks)
+            confirm = lambda: messagebox.askyesno("Update Detected", "An old 'FINAL RESULT' column was found. It is now outdated and will be removed.\n\nYou will need to run the calculator again after entering marks.\n\nProceed?", parent=self)
+            success, message = self.engine.add_new_assessment_column(self.sheet, name, max_marks, confirm_remove_final=confirm)
             if success:
                 messagebox.showinfo("Success", message, parent=self)
                 self.refresh_assessments()
             else:
                 messagebox.showerror("Error", message, parent=self)
 
+    @diagnostics.timed("ui.MarkEntryWindow.save_marks")
     def save_marks(self):
         assessment_name = self.assessment_combo.get()
         if not assessment_name or "No assessments" in assessment_name:
             return messagebox.showerror("Error", "Please select an assessment to save.", parent=self)
             
-        marks_from_grid = [entry.get().strip() for entry in self.entry_widgets]
-        
-        max_mark = self.app.get_max_marks(self.sheet, assessment_name)
-        if max_mark is None: return messagebox.showerror("Error", "Could not determine max marks.", parent=self)
+        errors = self.marks_grid.errors()
+        if errors:
+            i, error = errors[0]
+            return messagebox.showerror("Validation Error", f"{len(errors)} mark(s) need fixing before saving.\n\nError for student {i+1}: {error}", parent=self)
 
-        validated_marks = []
-        for i, mark_str in enumerate(marks_from_grid):
-            if not mark_str:
-                validated_marks.append(None)
-                continue
-            try:
-                mark_int = int(mark_str)
-                if not 0 <= mark_int <= max_mark:
-                    return messagebox.showerror("Validation Error", f"Error for student {i+1}: Mark '{mark_int}' is invalid. Must be between 0 and {max_mark}.", parent=self)
-                validated_marks.append(mark_int)
-            except (ValueError, TypeError):
-                return messagebox.showerror("Validation Error", f"Error for student {i+1}: '{mark_str}' is not a valid number.", parent=self)
+        # Only the rows edited since the marks were loaded are written
+        changes = self.marks_grid.changes()
+        if not changes:
+            return messagebox.showinfo("Status", f"No marks were changed for '{assessment_name}'.", parent=self)
 
-        if not messagebox.askyesno("Confirm Save", f"Save these marks for '{assessment_name}'?\nThis will overwrite any existing data.", parent=self):
+        if not messagebox.askyesno("Confirm Save", f"Save {len(changes)} changed mark(s) for '{assessment_name}'?\nThis will overwrite the existing marks of those students.", parent=self):
             return
 
-        success, message = self.app.save_marks(self.sheet, assessment_name, validated_marks)
+        success, message = self.engine.save_mark_changes(self.sheet, assessment_name, [(i, int(mark_str) if mark_str else None) for i, mark_str in changes])
+        if success:
+            self.marks_grid.mark_saved()
         messagebox.showinfo("Status", message, parent=self)
 # Placeholder classes for future implementation
 class MarkConverterDialog(ctk.CTkToplevel):
@@ -984,6 +921,7 @@ class MarkConverterDialog(ctk.CTkToplevel):
 
         self.mark_entry_window = master
         self.app = self.mark_entry_window.app
+        self.engine = self.app.engine
         self.sheet = self.mark_entry_window.sheet
         
         self.grid_columnconfigure(1, weight=1)
@@ -991,7 +929,7 @@ class MarkConverterDialog(ctk.CTkToplevel):
         ctk.CTkLabel(self, text="Convert Marks", font=ctk.CTkFont(size=16, weight="bold")).grid(row=0, column=0, columnspan=2, padx=20, pady=20)
 
         ctk.CTkLabel(self, text="Select Assessment:").grid(row=1, column=0, padx=20, pady=5, sticky="w")
-        self.assessment_combo = ctk.CTkComboBox(self, state="readonly", values=self.app.get_assessment_list(self.sheet), command=self.on_assessment_select)
+        self.assessment_combo = ctk.CTkComboBox(self, state="readonly", values=self.engine.get_assessment_list(self.sheet), command=self.on_assessment_select)
         self.assessment_combo.grid(row=1, column=1, padx=20, pady=5, sticky="ew")
 
         ctk.CTkLabel(self, text="Marks are currently out of:").grid(row=2, column=0, padx=20, pady=5, sticky="w")
@@ -1010,11 +948,12 @@ class MarkConverterDialog(ctk.CTkToplevel):
 
     def on_assessment_select(self, assessment_name):
         """Auto-fills the 'from' entry when an assessment is selected."""
-        max_mark = self.app.get_max_marks(self.sheet, assessment_name)
+        max_mark = self.engine.get_max_marks(self.sheet, assessment_name)
         self.from_entry.delete(0, "end")
         if max_mark is not None:
             self.from_entry.insert(0, str(max_mark))
 
+    @diagnostics.timed("ui.MarkConverterDialog.convert")
     def convert(self):
         assessment = self.assessment_combo.get()
         try:
@@ -1026,7 +965,7 @@ class MarkConverterDialog(ctk.CTkToplevel):
         if not messagebox.askyesno("Confirm", f"This will permanently convert all marks for '{assessment}' from a scale of {from_val} to {to_val}. This action cannot be undone. Continue?", parent=self):
             return
             
-        success, message = self.app.convert_marks(self.sheet, assessment, from_val, to_val)
+        success, message = self.engine.convert_marks(self.sheet, assessment, from_val, to_val)
         if success:
             self.mark_entry_window.load_marks_into_grid(assessment) # Refresh the grid
             messagebox.showinfo("Success", message, parent=self)
@@ -1046,6 +985,7 @@ class FinalResultDialog(ctk.CTkToplevel):
 
         self.mark_entry_window = master
         self.app = self.mark_entry_window.app
+        self.engine = self.app.engine
         self.sheet = self.mark_entry_window.sheet
         self.weight_entries = {}
 
@@ -1059,7 +999,7 @@ class FinalResultDialog(ctk.CTkToplevel):
         scroll_frame.grid_columnconfigure(0, weight=2)
         scroll_frame.grid_columnconfigure(1, weight=1)
         
-        for i, assessment in enumerate(self.app.get_assessment_list(self.sheet)):
+        for i, assessment in enumerate(self.engine.get_assessment_list(self.sheet)):
             ctk.CTkLabel(scroll_frame, text=assessment).grid(row=i, column=0, padx=10, pady=5, sticky="w")
             entry = ctk.CTkEntry(scroll_frame, placeholder_text="%")
             entry.grid(row=i, column=1, padx=10, pady=5, sticky="ew")
@@ -1068,6 +1008,7 @@ class FinalResultDialog(ctk.CTkToplevel):
         self.calc_button = ctk.CTkButton(self, text="Calculate and Add to Sheet", command=self.calculate)
         self.calc_button.grid(row=3, column=0, padx=20, pady=20)
 
+    @diagnostics.timed("ui.FinalResultDialog.calculate")
     def calculate(self):
         weights_dict = {}
         total_weight = 0
@@ -1087,7 +1028,7 @@ class FinalResultDialog(ctk.CTkToplevel):
         # The final column name is now fixed
         final_col_name = "FINAL RESULT"
 
-        success, message = self.app.calculate_final_result(self.sheet, weights_dict, final_col_name)
+        success, message = self.engine.calculate_final_result(self.sheet, weights_dict, final_col_name)
         if success:
             self.mark_entry_window.refresh_assessments()
             messagebox.showinfo("Success", message, parent=self)
@@ -1106,11 +1047,15 @@ class LiveSessionWindow(ctk.CTkToplevel):
         self.focus()
 
         self.app = master
+        self.engine = master.engine
         self.sheet = sheet
         self.otp = None
-        self.is_polling = False # Flag to control the background thread
-        self.all_students = self.app.get_student_list(self.sheet)
-        self.all_rolls = self.app.get_complex_rolls(self.sheet)
+        self.live = None # the app's LiveSessionManager, once this session starts
+        self.store = master.live_store # local checkpoints of unsaved sessions
+        self.session_date = self.session_hours = None
+        self.closed = False
+        self.all_students = self.engine.get_student_list(self.sheet)
+        self.all_rolls = self.engine.get_complex_rolls(self.sheet)
 
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(3, weight=1)
@@ -1137,14 +1082,30 @@ class LiveSessionWindow(ctk.CTkToplevel):
         # --- Live List of Present Students ---
         self.live_list_frame = ctk.CTkScrollableFrame(self, label_text="Present Students (Live)")
         self.live_list_frame.grid(row=3, column=0, padx=10, pady=10, sticky="nsew")
+        # One persistent label per student, keyed by complex roll number (a roll listed twice has two rows);
+        # polls only restyle the rows whose state changed
+        self.present_font = ctk.CTkFont(weight="bold")
+        self.absent_font = ctk.CTkFont(weight="normal")
+        self.roster_rows = {}
+        for name, roll in zip(self.all_students, self.all_rolls):
+            label = ctk.CTkLabel(self.live_list_frame, text=f"{name} ({roll})", text_color="gray60", font=self.absent_font)
+            label.pack(anchor="w", padx=5)
+            self.roster_rows.setdefault(roll, []).append(label)
+        self.last_payload = None # the present list as last received, for the no-change shortcut
+        self.present_rolls = frozenset()
         
         # --- Finish Button (No Refresh Button) ---
         self.finish_button = ctk.CTkButton(self, text="Finish Session & Save", state="disabled", command=self.finish_session)
-        self.finish_button.grid(row=4, column=0, padx=10, pady=20, sticky="ew")
+        self.finish_button.grid(row=4, column=0, padx=10, pady=(20, 5), sticky="ew")
+        # Polling and checkpoint problems; cleared by the next list that comes through
+        self.status_label = ctk.CTkLabel(self, text="", text_color=("#C00000", "#FF8282"), wraplength=420)
+        self.status_label.grid(row=5, column=0, padx=10, pady=(0, 10), sticky="ew")
         
         self.protocol("WM_DELETE_WINDOW", self.on_close)
         self.update_ui_list([])
+        self.after(200, self.offer_pending_sessions)
 
+    @diagnostics.timed("ui.LiveSessionWindow.start_session")
     def start_session(self):
         date_str = self.date_entry.get()
         hours_str = self.hours_entry.get()
@@ -1154,99 +1115,196 @@ class LiveSessionWindow(ctk.CTkToplevel):
             num_hours = int(hours_str)
             if not 1 <= num_hours <= 8: return messagebox.showerror("Error", "Hours must be between 1 and 8.", parent=self)
         except (ValueError, TypeError): return messagebox.showerror("Error", "Hours must be a valid number.", parent=self)
-        for col in range(4, self.sheet.max_column + 2):
-            if self.sheet.cell(row=2, column=col).value == date_str:
-                return messagebox.showerror("Error", "Attendance for this date has already been marked.", parent=self)
-
-        self.start_button.configure(state="disabled", text="Session Active...")
+        if date_str in self.engine.schema_for(self.sheet).dates:
+            return messagebox.showerror("Error", "Attendance for this date has already been marked.", parent=self)
+
+        self.session_date, self.session_hours = date_str, num_hours
+        self.set_session_inputs("disabled")
+        self.start_button.configure(state="disabled", text="Connecting...")
+        self.otp_label.configure(text="Contacting server...")
+        # The request runs on the session manager's workers, so a slow server never freezes the window
+        self.live = self.app.live_session_manager()
+        self.live.run(self.live.client.start_session, self.sheet.title, self.all_rolls,
+                      on_done=self.session_started, on_error=self.session_not_started)
+
+    def set_session_inputs(self, state):
+        self.date_entry.configure(state=state)
+        self.hours_entry.configure(state=state)
+
+    def session_started(self, data):
+        if data.get('status') != 'success':
+            return self.session_not_started(data.get('message'), title="API Error")
+        self.otp = data.get('otp')
+        if self.closed: return self.live.finish(self.otp, on_error=self.finish_failed) # Closed while the session was starting
+        # Checkpointed locally from now on, so the attendance survives a lost connection or a crash
+        self.store.start(self.otp, self.app.current_filename, self.sheet.title, self.session_date, self.session_hours)
+        self.otp_label.configure(text=f"OTP: {self.otp}")
+        self.start_button.configure(text="Session Active...")
         self.finish_button.configure(state="normal")
-        
-        api_url = "https://ismailisims.pythonanywhere.com/attendance/api/start-session/"
-        payload = {"teacher_username": "default_teacher", "subject_name": self.sheet.title, "valid_rolls": self.all_rolls}
-        try:
-            response = requests.post(api_url, json=payload, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            if data.get('status') == 'success':
-                self.otp = data.get('otp')
-                self.otp_label.configure(text=f"OTP: {self.otp}")
-                # --- Start the automatic polling thread ---
-                self.is_polling = True
-                threading.Thread(target=self.poll_for_updates, daemon=True).start()
-            else:
-                messagebox.showerror("API Error", data.get('message'), parent=self)
-                self.start_button.configure(state="normal", text="Start Session & Generate OTP")
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Connection Error", f"Could not connect to server: {e}", parent=self)
-            self.start_button.configure(state="normal", text="Start Session & Generate OTP")
-
-    def poll_for_updates(self):
-        """Runs in a background thread, automatically polling the server for updates."""
-        while self.is_polling:
-            api_url = f"https://ismailisims.pythonanywhere.com/attendance/api/get-present-list/?otp={self.otp}"
-            try:
-                response = requests.get(api_url, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('status') == 'success':
-                        present_students = data.get('present_students', [])
-                        self.app.after(0, self.update_ui_list, present_students)
-                        if not data.get('is_active', True):
-                            self.is_polling = False
-                            self.app.after(0, self.session_expired_message)
-            except requests.exceptions.RequestException as e:
-                print(f"Polling connection error: {e}")
-            
-            time.sleep(10) # Poll every 5 seconds
-
+        self.watch_session()
+
+    def session_not_started(self, error, title="Connection Error"):
+        if self.closed: return
+        message = error if title == "API Error" else f"Could not connect to server: {error}"
+        messagebox.showerror(title, message, parent=self)
+        self.otp_label.configure(text="OTP will appear here")
+        self.start_button.configure(state="normal", text="Start Session & Generate OTP")
+        self.set_session_inputs("normal")
+
+    def watch_session(self):
+        """Has the app's session manager poll this session; only changed lists come back to this window."""
+        otp = self.otp
+        self.live.watch(otp, self.update_ui_list, on_expired=self.session_expired_message,
+                        on_error=self.polling_failed,
+                        checkpoint=lambda present: self.store.update(otp, present))
+
+    def polling_failed(self, error):
+        """A poll or local checkpoint failed; polling goes on, backing off while the server is unreachable."""
+        if self.closed: return self.app.show_status(f"Live session {self.otp}: {error}", is_error=True)
+        self.status_label.configure(text=f"Connection problem, still retrying: {error}")
+
+    def finish_failed(self, error):
+        # Usually arrives after the window has closed, so it goes to the main window
+        self.app.show_status(f"Could not tell the server live session {self.otp} is over: {error}", is_error=True)
+
+    def stop_polling(self):
+        if self.live is not None and self.otp:
+            self.live.unwatch(self.otp)
+
+    @diagnostics.timed("ui.LiveSessionWindow.update_ui_list")
     def update_ui_list(self, present_students):
-        """Updates the listbox on the main GUI thread."""
-        for widget in self.live_list_frame.winfo_children():
-            widget.destroy()
-        
+        """Updates the live list on the main GUI thread, restyling only the students whose state changed."""
+        if present_students == self.last_payload: return # Nothing new since the last poll
+        self.last_payload = list(present_students)
+        self.status_label.configure(text="")
+        present_rolls = frozenset(present_students)
+        for roll in present_rolls.symmetric_difference(self.present_rolls):
+            is_present = roll in present_rolls
+            for label in self.roster_rows.get(roll, ()):
+                label.configure(text_color="#28a745" if is_present else "gray60", font=self.present_font if is_present else self.absent_font)
+        self.present_rolls = present_rolls
         self.live_list_frame.configure(label_text=f"Present Students ({len(present_students)} / {len(self.all_students)})")
-        present_rolls_set = set(present_students)
-        for name, roll in zip(self.all_students, self.all_rolls):
-            is_present = roll in present_rolls_set
-            label_text = f"{name} ({roll})"
-            label_color = "#28a745" if is_present else "gray60"
-            ctk.CTkLabel(self.live_list_frame, text=label_text, text_color=label_color, font=ctk.CTkFont(weight="bold" if is_present else "normal")).pack(anchor="w", padx=5)
 
     def session_expired_message(self):
         self.otp_label.configure(text="SESSION EXPIRED")
         messagebox.showinfo("Session Expired", "The OTP has expired. Click Finish to save the results.", parent=self)
 
+    @diagnostics.timed("ui.LiveSessionWindow.finish_session")
     def finish_session(self):
-        self.is_polling = False # Stop the polling thread
-        self.finish_button.configure(state="disabled")
-        
-        api_url = f"https://ismailisims.pythonanywhere.com/attendance/api/get-present-list/?otp={self.otp}"
-        try:
-            response = requests.get(api_url, timeout=5)
-            data = response.json()
-            present_rolls = set(data.get('present_students', []))
-            
-            roll_map = {roll: i + 1 for i, roll in enumerate(self.all_rolls)}
-            absent_rolls_simple = [roll_map[r] for r in self.all_rolls if r not in present_rolls]
-            
-            date_str = self.date_entry.get()
-            num_hours = int(self.hours_entry.get())
-            
-            success, msg = self.app.mark_attendance(self.sheet, len(self.all_students), absent_rolls_simple, num_hours, date_str)
+        self.stop_polling()
+        self.finish_button.configure(state="disabled", text="Getting final list...")
+        # The final list is fetched in full, off the GUI thread, retrying with backoff while the server is unreachable
+        self.live.run(self.live.client.get_present_list, self.otp, True, attempts=LIVE_RETRY_ATTEMPTS,
+                      on_done=lambda result: self.save_session(result[0]),
+                      on_retry=self.final_list_retry, on_error=self.final_list_failed)
+
+    def final_list_retry(self, attempt, error):
+        if self.closed: return
+        self.finish_button.configure(text=f"Server unreachable, retrying ({attempt}/{LIVE_RETRY_ATTEMPTS - 1})...")
+
+    def final_list_failed(self, error):
+        if self.closed: return
+        entry = self.store.get(self.otp)
+        present = entry["present"] if entry else sorted(self.present_rolls)
+        checked = datetime.fromtimestamp(entry["updated"]).strftime("%H:%M:%S") if entry else "the last poll"
+        if messagebox.askyesno("Connection Error", f"Could not get the final list: {error}\n\nSave the last list received instead ({len(present)} present at {checked})? Students who joined after that will be marked absent.", parent=self):
+            return self.save_session(present)
+        # Keep the session (and its checkpoint) so Finish can be tried again later
+        self.finish_button.configure(state="normal", text="Finish Session & Save")
+        self.watch_session()
+
+    def save_session(self, present_rolls):
+        if self.closed: return
+        success, msg = self.commit_attendance(present_rolls, self.session_date, self.session_hours)
+        if success:
+            self.store.remove(self.otp)
+            messagebox.showinfo("Success", "Attendance has been saved to the Excel file.", parent=self)
+            self.on_close() # Also tells the server the session is over, retrying in the background
+        else:
+            messagebox.showerror("Error", f"Failed to save to Excel: {msg}", parent=self)
+            self.finish_button.configure(state="normal", text="Finish Session & Save")
+
+    def commit_attendance(self, present_rolls, date_str, num_hours, overwrite_col=None):
+        """Marks everyone not in present_rolls absent for the session."""
+        absent_rolls_simple = self.engine.roll_index(self.sheet).absent_serials(present_rolls)
+        return self.engine.mark_attendance(self.sheet, len(self.all_students), absent_rolls_simple, num_hours, date_str, overwrite_col=overwrite_col)
+
+    def offer_pending_sessions(self):
+        """Offers to save (or discard) live sessions of this subject that were never saved, e.g. after a crash
+        or when the server could not be reached, from their last local checkpoint."""
+        for entry in self.store.pending(self.app.current_filename, self.sheet.title):
+            checked = datetime.fromtimestamp(entry["updated"]).strftime("%d-%m-%Y %H:%M")
+            answer = messagebox.askyesnocancel("Unsaved Live Session", f"A live session for {entry['date']} ({entry['hours']} hour(s)) was never saved to the sheet. {len(entry['present'])} student(s) were present when it was last checked ({checked}).\n\nYes: save it now\nNo: discard it\nCancel: keep it for later", parent=self)
+            if answer is None: continue
+            if not answer:
+                self.store.remove(entry["otp"])
+                continue
+            overwrite_col = self.engine.schema_for(self.sheet).dates.get(entry["date"])
+            if overwrite_col and not messagebox.askyesno("Date Already Marked", f"Attendance for {entry['date']} is already marked. Overwrite it with this session?", parent=self):
+                continue
+            success, msg = self.commit_attendance(entry["present"], entry["date"], entry["hours"], overwrite_col)
             if success:
-                messagebox.showinfo("Success", "Attendance has been saved to the Excel file.", parent=self)
-                self.on_close(finish_session_on_server=False) # Already finished, just close
+                self.store.remove(entry["otp"])
+                messagebox.showinfo("Success", f"The session of {entry['date']} has been saved to the Excel file.", parent=self)
             else:
                 messagebox.showerror("Error", f"Failed to save to Excel: {msg}", parent=self)
-        except requests.exceptions.RequestException as e:
-            messagebox.showerror("Connection Error", f"Could not get final list: {e}", parent=self)
-            self.finish_button.configure(state="normal")
     
     def on_close(self, finish_session_on_server=True):
-        self.is_polling = False # Ensure polling stops
-        if self.otp and finish_session_on_server:
-            api_url = "https://ismailisims.pythonanywhere.com/attendance/api/finish-session/"
-            try:
-                threading.Thread(target=lambda: requests.post(api_url, json={'otp': self.otp}, timeout=3), daemon=True).start()
-            except: pass
-        self.destroy()
\ No newline at end of file
+        self.closed = True
+        self.stop_polling() # Ensure polling stops
+        if self.live is not None and self.otp:
+            # Sent from the manager's worker pool rather than a thread of its own
+            if finish_session_on_server: self.live.finish(self.otp, on_error=self.finish_failed)
+            else: self.live.client.forget(self.otp)
+            self.store.release(self.otp)
+        self.destroy()
+
+class DiagnosticsWindow(ctk.CTkToplevel):
+    """Hidden panel (Ctrl+Shift+D) listing the slowest recent operations from the diagnostics log."""
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Diagnostics")
+        self.geometry("820x560")
+        self.transient(master)
+        self.focus()
+        try:
+            self.iconbitmap(resource_path(ICON_PATH))
+        except: pass
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        controls_frame = ctk.CTkFrame(self)
+        controls_frame.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="ew")
+        controls_frame.grid_columnconfigure(2, weight=1)
+        ctk.CTkButton(controls_frame, text="Refresh", width=100, command=self.refresh).grid(row=0, column=0, padx=10, pady=10)
+        ctk.CTkButton(controls_frame, text="Clear", width=100, fg_color="gray50", command=self.clear).grid(row=0, column=1, padx=(0, 10), pady=10)
+        profiling = "cProfile capture is ON for this session." if diagnostics.is_profiling() else "cProfile capture is off."
+        if not diagnostics.counting_cells():
+            profiling += " Cell counts off (start with --diagnostics)."
+        ctk.CTkLabel(controls_frame, text=profiling, text_color="gray60").grid(row=0, column=2, padx=10, pady=10, sticky="e")
+
+        self.textbox = ctk.CTkTextbox(self, corner_radius=8, font=("Consolas", 12), wrap="none")
+        self.textbox.grid(row=1, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.refresh()
+
+    def refresh(self):
+        lines = [f"{'OPERATION':<48}{'MS':>10}{'READS':>9}{'WRITES':>9}{'BYTES':>11}  WHEN      THREAD", '-' * 110]
+        for op in diagnostics.slowest(30):
+            when = datetime.fromtimestamp(op["started"]).strftime("%H:%M:%S")
+            name = op["name"] if op["ok"] else op["name"] + " (failed)"
+            lines.append(f"{name:<48}{op['seconds'] * 1000:>10.1f}{op['cell_reads']:>9}{op['cell_writes']:>9}{op['bytes_written']:>11}  {when}  {op['thread']}")
+        lines += ['', f"{'TOTALS BY OPERATION':<48}{'CALLS':>7}{'TOTAL MS':>12}{'MAX MS':>10}", '-' * 77]
+        for name, (calls, total, longest) in diagnostics.summary():
+            lines.append(f"{name:<48}{calls:>7}{total * 1000:>12.1f}{longest * 1000:>10.1f}")
+        if len(lines) == 5:
+            lines = ["No operations recorded yet."]
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", "\n".join(lines))
+        self.textbox.configure(state="disabled")
+
+    def clear(self):
+        diagnostics.clear()
+        self.refresh()
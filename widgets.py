@@ -0,0 +1,305 @@
+import customtkinter as ctk
+
+
+class VirtualList(ctk.CTkFrame):
+    """Base for lists that only create widgets for the rows on screen.
+
+    The data lives in plain Python lists; a small pool of row widgets, sized to the visible
+    area, is re-filled as the list scrolls, so thousands of entries cost no more widgets than
+    a screenful. Used as is, it lists str() of each item in self.view; subclasses override
+    _make_row(slot) and _show_row(row, position) for richer rows."""
+    def __init__(self, master, row_height=28, **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_height = row_height
+        self.view = []   # the data indexes shown, in order
+        self.offset = 0  # first position of the view shown in the pool
+        self.rows = []   # the pool of row widgets
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=2, column=0, padx=(10, 0), pady=(0, 5), sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=2, column=1, padx=(0, 5), pady=(0, 5), sticky="ns")
+        self.body.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self.body)
+
+    def _make_row(self, slot):
+        """Creates the pool widget for one visible slot."""
+        row = ctk.CTkLabel(self.body, text="", anchor="w")
+        self._bind_wheel(row)
+        return row
+
+    def _show_row(self, row, position):
+        """Fills a pool row with the item at a view position, or blanks it if position is None."""
+        row.configure(text="" if position is None else str(self.view[position]))
+
+    # --- Rendering ---
+    def _visible_rows(self):
+        return max(1, self.body.winfo_height() // self.row_height)
+
+    def _on_resize(self, event=None):
+        needed = self._visible_rows()
+        while len(self.rows) < needed:
+            self.rows.append(self._make_row(len(self.rows)))
+        for slot, row in enumerate(self.rows):
+            if slot < needed: row.place(x=0, y=slot * self.row_height, relwidth=1.0, height=self.row_height)
+            else: row.place_forget()
+        self.render()
+
+    def render(self):
+        """Re-fills the pool for the current scroll position; no widgets are created here."""
+        visible = min(len(self.rows), self._visible_rows())
+        self.offset = max(0, min(self.offset, len(self.view) - visible))
+        for slot, row in enumerate(self.rows[:visible]):
+            position = self.offset + slot
+            self._show_row(row, position if position < len(self.view) else None)
+        if self.view:
+            self.scrollbar.set(self.offset / len(self.view), min(1.0, (self.offset + visible) / len(self.view)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # --- Scrolling ---
+    def scroll_to(self, offset):
+        self.offset = int(offset)
+        self.render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self.view))
+        elif action == "scroll":
+            step = self._visible_rows() if unit == "pages" else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def _on_wheel(self, event):
+        if getattr(event, 'num', None) == 4: steps = -3
+        elif getattr(event, 'num', None) == 5: steps = 3
+        else: steps = -3 if event.delta > 0 else 3
+        self.scroll_to(self.offset + steps)
+        return "break"
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel, add="+")
+        widget.bind("<Button-4>", self._on_wheel, add="+") # X11 scroll up
+        widget.bind("<Button-5>", self._on_wheel, add="+") # X11 scroll down
+
+
+class VirtualChecklist(VirtualList):
+    """A filterable multi-select list. Click toggles a row, Shift+click selects the range from the
+    last clicked row, and 'All'/'None' act on every item matching the filter, visible or not."""
+    def __init__(self, master, items=(), label_text="", row_height=28, **kwargs):
+        super().__init__(master, row_height=row_height, **kwargs)
+        self.items = []
+        self.selection = set() # indexes into items
+        self.anchor = None     # view position of the last plain click, for Shift+click ranges
+
+        header = ctk.CTkFrame(self, fg_color="transparent")
+        header.grid(row=0, column=0, columnspan=2, padx=5, pady=(5, 0), sticky="ew")
+        header.grid_columnconfigure(1, weight=1)
+        self.count_label = ctk.CTkLabel(header, text=label_text)
+        self.label_text = label_text
+        self.count_label.grid(row=0, column=0, padx=5, sticky="w")
+        ctk.CTkButton(header, text="All", width=45, command=self.select_all).grid(row=0, column=2, padx=(5, 0))
+        ctk.CTkButton(header, text="None", width=45, fg_color="gray50", command=self.clear).grid(row=0, column=3, padx=5)
+        self.filter_entry = ctk.CTkEntry(self, placeholder_text="Filter...")
+        self.filter_entry.grid(row=1, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
+        self.filter_entry.bind("<KeyRelease>", lambda event: self.apply_filter(force=False))
+        self._filter_text = ""
+        self.set_items(items)
+
+    # --- Data ---
+    def set_items(self, items):
+        """Replaces the items and clears the selection."""
+        self.items = list(items)
+        self.selection.clear()
+        self.anchor = None
+        self.apply_filter()
+
+    def apply_filter(self, force=True):
+        text = self.filter_entry.get().strip().upper()
+        if text == self._filter_text and not force: return
+        self._filter_text = text
+        self.anchor = None
+        self.view = [i for i, item in enumerate(self.items) if text in str(item).upper()] if text else list(range(len(self.items)))
+        self.offset = 0
+        self.render()
+
+    def selected(self):
+        """The selected items, in list order."""
+        return [self.items[i] for i in sorted(self.selection)]
+
+    def select_all(self):
+        """Selects every item matching the filter."""
+        self.selection.update(self.view)
+        self.render()
+
+    def clear(self):
+        """Deselects every item matching the filter."""
+        self.selection.difference_update(self.view)
+        self.render()
+
+    def _toggle(self, slot):
+        position = self.offset + slot
+        if position >= len(self.view): return
+        index = self.view[position]
+        if index in self.selection: self.selection.discard(index)
+        else: self.selection.add(index)
+        self.anchor = position
+        self._update_count()
+
+    def _select_range(self, slot):
+        position = self.offset + slot
+        if position >= len(self.view): return "break"
+        start = self.anchor if self.anchor is not None and self.anchor < len(self.view) else position
+        low, high = sorted((start, position))
+        self.selection.update(self.view[low:high + 1])
+        self.render()
+        return "break" # The plain click binding would toggle the row again
+
+    # --- Rows ---
+    def _make_row(self, slot):
+        row = ctk.CTkCheckBox(self.body, text="", height=self.row_height - 4, command=lambda: self._toggle(slot))
+        row.bind("<Shift-Button-1>", lambda event: self._select_range(slot))
+        self._bind_wheel(row)
+        return row
+
+    def _show_row(self, row, position):
+        if position is None:
+            row.configure(text="", state="disabled")
+            row.deselect()
+            return
+        index = self.view[position]
+        row.configure(text=str(self.items[index]), state="normal")
+        if index in self.selection: row.select()
+        else: row.deselect()
+
+    def render(self):
+        super().render()
+        self._update_count()
+
+    def _update_count(self):
+        self.count_label.configure(text=f"{self.label_text} ({len(self.selection)} of {len(self.items)} selected)")
+
+
+class VirtualEntryGrid(VirtualList):
+    """An editable two-column list (label, value) backed by a list of strings.
+
+    Edits are stored as they are typed and checked by validate(text) -> error message or None;
+    invalid rows get a red border and the first problem is shown above the grid. changes()
+    returns only the rows whose text differs from what set_values() loaded."""
+    INVALID_COLOR = ("#C00000", "#FF8282")
+
+    def __init__(self, master, labels=(), label_text="", validate=None, row_height=36, **kwargs):
+        super().__init__(master, row_height=row_height, **kwargs)
+        self.labels = list(labels)
+        self.validate = validate
+        self.values = [''] * len(self.labels)
+        self.original = list(self.values)
+        self.invalid = {} # row index -> message
+        self.view = list(range(len(self.labels)))
+        self.label_text = label_text
+        self._default_border = None
+
+        self.status_label = ctk.CTkLabel(self, text=label_text, anchor="w")
+        self._default_text_color = self.status_label.cget("text_color")
+        self.status_label.grid(row=0, column=0, columnspan=2, padx=10, pady=(5, 0), sticky="ew")
+
+    # --- Data ---
+    def set_values(self, values):
+        """Loads new values (e.g. another assessment's marks); they become the unchanged state."""
+        values = [str(value) for value in values[:len(self.labels)]]
+        self.values = values + [''] * (len(self.labels) - len(values))
+        self.original = list(self.values)
+        self.revalidate()
+
+    def revalidate(self):
+        """Checks every value again, e.g. after the validator or the values changed."""
+        self.invalid = {}
+        if self.validate:
+            for index, text in enumerate(self.values):
+                message = self.validate(text.strip())
+                if message: self.invalid[index] = message
+        self.render()
+
+    def changes(self):
+        """(row index, text) for every row edited since set_values or mark_saved."""
+        return [(index, text.strip()) for index, (text, old) in enumerate(zip(self.values, self.original)) if text.strip() != old.strip()]
+
+    def mark_saved(self):
+        self.original = list(self.values)
+        self._update_status()
+
+    def errors(self):
+        """(row index, message) of every invalid row, in row order."""
+        return sorted(self.invalid.items())
+
+    def _edited(self, slot, entry):
+        position = self.offset + slot
+        if position >= len(self.view): return
+        index = self.view[position]
+        text = entry.get()
+        if text == self.values[index]: return
+        self.values[index] = text
+        message = self.validate(text.strip()) if self.validate else None
+        if message: self.invalid[index] = message
+        else: self.invalid.pop(index, None)
+        self._paint_border(entry, index)
+        self._update_status()
+
+    def _move(self, slot, step):
+        """Moves the focus to the entry step rows away, scrolling the pool at its edges."""
+        target = slot + step
+        visible = min(len(self.rows), self._visible_rows())
+        if target < 0 or target >= visible:
+            self.scroll_to(self.offset + step)
+            target = max(0, min(target, visible - 1))
+        self.rows[target].entry.focus_set()
+        return "break"
+
+    # --- Rows ---
+    def _make_row(self, slot):
+        row = ctk.CTkFrame(self.body, fg_color="transparent")
+        row.grid_columnconfigure(0, weight=3)
+        row.grid_columnconfigure(1, weight=1)
+        row.label = ctk.CTkLabel(row, text="", anchor="w")
+        row.label.grid(row=0, column=0, padx=10, sticky="ew")
+        row.entry = ctk.CTkEntry(row)
+        row.entry.grid(row=0, column=1, padx=10, sticky="ew")
+        if self._default_border is None:
+            self._default_border = row.entry.cget("border_color")
+        row.entry.bind("<KeyRelease>", lambda event: self._edited(slot, row.entry))
+        row.entry.bind("<FocusOut>", lambda event: self._edited(slot, row.entry))
+        row.entry.bind("<Return>", lambda event: self._move(slot, 1))
+        row.entry.bind("<Down>", lambda event: self._move(slot, 1))
+        row.entry.bind("<Up>", lambda event: self._move(slot, -1))
+        for widget in (row, row.label, row.entry):
+            self._bind_wheel(widget)
+        return row
+
+    def _show_row(self, row, position):
+        row.entry.configure(state="normal")
+        row.entry.delete(0, "end")
+        if position is None:
+            row.label.configure(text="")
+            row.entry.configure(state="disabled")
+            return
+        index = self.view[position]
+        row.label.configure(text=f"{index + 1}. {self.labels[index]}")
+        row.entry.insert(0, self.values[index])
+        self._paint_border(row.entry, index)
+
+    def _paint_border(self, entry, index):
+        entry.configure(border_color=self.INVALID_COLOR if index in self.invalid else self._default_border)
+
+    def render(self):
+        super().render()
+        self._update_status()
+
+    def _update_status(self):
+        if self.invalid:
+            index, message = min(self.invalid.items())
+            self.status_label.configure(text=f"{len(self.invalid)} invalid mark(s). Student {index + 1}: {message}", text_color=self.INVALID_COLOR)
+            return
+        changed = len(self.changes())
+        text = f"{self.label_text} ({changed} unsaved change(s))" if changed else self.label_text
+        self.status_label.configure(text=text, text_color=self._default_text_color)